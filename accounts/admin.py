@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import User
-from .models import UserProfile # Make sure UserProfile is imported
+from .models import UserProfile, SearchJob # Make sure UserProfile is imported
 
 # Define an inline admin descriptor for UserProfile model
 class UserProfileInline(admin.StackedInline):
@@ -31,3 +31,12 @@ class UserAdmin(BaseUserAdmin):
 # It's better to unregister first, then register with the custom admin
 admin.site.unregister(User)
 admin.site.register(User, UserAdmin)
+
+
+@admin.register(SearchJob)
+class SearchJobAdmin(admin.ModelAdmin):
+    list_display = ('query', 'user', 'status', 'attempts', 'worker', 'created_at', 'finished_at')
+    list_filter = ('status',)
+    search_fields = ('query', 'user__username')
+    raw_id_fields = ('user',)
+    readonly_fields = ('created_at', 'updated_at', 'finished_at')
@@ -0,0 +1,41 @@
+"""
+Set-based approval and rejection of pending users, for the dashboard's bulk actions.
+
+Users are handled in id-ordered batches: each batch is one UPDATE (approve) or
+one cascading delete (reject) in its own transaction, so a large backlog never
+holds the database's write lock for long. Approving skips User.save() and with
+it the post_save profile signal; that is safe because the profile was created
+when the user registered and approval changes nothing on it.
+"""
+from django.contrib.auth.models import User
+from django.db import transaction
+
+BATCH_SIZE = 1000
+
+
+def _in_batches(queryset, apply, batch_size):
+    done = 0
+    last_pk = 0
+    while True:
+        ids = list(queryset.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return done
+        with transaction.atomic():
+            # The batch re-applies ``queryset``'s filters, is_active=False among them: a user
+            # approved or deleted since the ids were read is skipped rather than handled twice.
+            done += apply(queryset.filter(pk__in=ids))
+        last_pk = ids[-1]
+
+
+def approve_users(queryset, batch_size=BATCH_SIZE):
+    """Activate the pending users in ``queryset``; returns how many were approved."""
+    return _in_batches(queryset.filter(is_active=False), lambda batch: batch.update(is_active=True), batch_size)
+
+
+def reject_users(queryset, batch_size=BATCH_SIZE):
+    """Delete the pending users in ``queryset`` (and their profiles, jobs, ...); returns how many were deleted."""
+    def delete(batch):
+        deleted, per_model = batch.delete()
+        return per_model.get(User._meta.label, 0)
+
+    return _in_batches(queryset.filter(is_active=False), delete, batch_size)
@@ -1,6 +1,17 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_save
 
 
 class AccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'accounts'
+
+    def ready(self):
+        from .user_search import repair_sqlite_index
+        post_migrate.connect(repair_sqlite_index, sender=self)
+
+        from .media_storage import profile_post_delete, profile_post_save, profile_pre_save
+        from .models import UserProfile
+        pre_save.connect(profile_pre_save, sender=UserProfile)
+        post_save.connect(profile_post_save, sender=UserProfile)
+        post_delete.connect(profile_post_delete, sender=UserProfile)
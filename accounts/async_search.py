@@ -0,0 +1,135 @@
+"""
+Async search path used by ``search_view_async`` when the site runs under ASGI.
+
+The title fetches are coroutines on shared ``httpx.AsyncClient``s, so hundreds
+of in-flight searches can wait on result pages in one process without holding a
+thread each. The upstream search itself still goes through the googlesearch
+library in a worker thread (views._search_upstream), so the sync and async views
+can't drift apart in how they scrape results.
+"""
+import asyncio
+import weakref
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+import httpx
+from django.conf import settings
+
+from .html_title import CHUNK_SIZE, aread_head, title_from_bytes
+from .http_client import DEFAULT_HEADERS
+from .titles import (
+    FETCH_ERROR_TITLE, PARSE_ERROR_TITLE, PENDING_TITLE, TitleFetch,
+    fetch_titles_async, get_title_cache, run_in_background,
+)
+
+# Event loop -> {(scheme, host:port): AsyncClient}. httpx pools can't be shared
+# across loops, and a single client's pool rescans every connection it holds on
+# each request, which gets slow with hundreds of them. So, like urllib3's per-host
+# pools behind requests, each origin gets its own small client, and only the
+# OUTBOUND_HTTP_POOL_HOSTS most recently used are kept.
+_clients = weakref.WeakKeyDictionary()
+_ssl_context = None
+
+
+def _get_ssl_context():
+    # httpx's default context (its bundled CA certificates). Building one is expensive,
+    # as it loads the whole bundle, so every client shares it.
+    global _ssl_context
+    if _ssl_context is None:
+        _ssl_context = httpx.create_ssl_context()
+    return _ssl_context
+
+
+def get_async_client(url):
+    """Return the client for ``url``'s origin on the running event loop."""
+    clients = _clients.setdefault(asyncio.get_running_loop(), OrderedDict())
+    parts = urlsplit(url)
+    origin = (parts.scheme, parts.netloc)
+    client = clients.get(origin)
+    if client is not None and not client.is_closed:
+        clients.move_to_end(origin)
+        return client
+    client = httpx.AsyncClient(
+        headers=DEFAULT_HEADERS,
+        timeout=httpx.Timeout(settings.OUTBOUND_HTTP_READ_TIMEOUT, connect=settings.OUTBOUND_HTTP_CONNECT_TIMEOUT),
+        limits=httpx.Limits(max_connections=None, max_keepalive_connections=settings.OUTBOUND_HTTP_POOL_PER_HOST),
+        verify=_get_ssl_context(),
+        follow_redirects=True,
+    )
+    clients[origin] = client
+    while len(clients) > settings.OUTBOUND_HTTP_POOL_HOSTS:
+        # Not closed: requests may still be running on it. Its connections go
+        # when the last of them finishes and the client is garbage collected.
+        clients.popitem(last=False)
+    return client
+
+
+async def _drain(response, chunks):
+    # As in http_client.release(): read off a small unread remainder so the
+    # connection can go back to the pool; anything bigger is left for the
+    # stream's close to discard along with the connection.
+    try:
+        length = int(response.headers['Content-Length'])
+    except (KeyError, ValueError):
+        return
+    if length - response.num_bytes_downloaded > settings.OUTBOUND_HTTP_DRAIN_BYTES:
+        return
+    async for _ in chunks:
+        pass
+
+
+async def fetch_title(url, etag=None, last_modified=None):
+    """Coroutine counterpart of views._fetch_title_from_url(); returns a TitleFetch."""
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    try:
+        async with get_async_client(url).stream('GET', url, headers=headers) as response:
+            if response.status_code == 304:
+                return TitleFetch(None, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+            response.raise_for_status()
+            chunks = response.aiter_bytes(CHUNK_SIZE)
+            data = await aread_head(chunks, max_bytes=settings.SEARCH_TITLE_MAX_BYTES)
+            title = title_from_bytes(data, response.headers.get('Content-Type'))
+            await _drain(response, chunks)
+            return TitleFetch(title or "No title found", response.headers.get('ETag'), response.headers.get('Last-Modified'))
+    except httpx.HTTPError:
+        return TitleFetch(FETCH_ERROR_TITLE)
+    except Exception:
+        return TitleFetch(PARSE_ERROR_TITLE)
+
+
+async def get_title(url):
+    return await get_title_cache().aget_or_fetch(url, fetch_title)
+
+
+async def resolve_titles(items):
+    """Async version of views._resolve_titles(): fill in pending titles of ``items`` in place."""
+    pending = [item for item in items if item['title'] == PENDING_TITLE]
+    if not pending:
+        return False
+    resolved = await fetch_titles_async(
+        [item['url'] for item in pending],
+        get_title,
+        deadline=settings.SEARCH_TITLE_DEADLINE,
+        max_concurrency=settings.SEARCH_TITLE_WORKERS,
+        per_host_limit=settings.SEARCH_TITLE_PER_HOST,
+    )
+    changed = False
+    for item, result in zip(pending, resolved):
+        if result['title'] != PENDING_TITLE:
+            item['title'] = result['title']
+            changed = True
+    return changed
+
+
+def prefetch_titles(urls):
+    """Warm the title cache for ``urls`` with background tasks on the current loop."""
+    if urls:
+        run_in_background(fetch_titles_async(
+            urls, get_title,
+            max_concurrency=settings.SEARCH_PREFETCH_WORKERS,
+            per_host_limit=settings.SEARCH_TITLE_PER_HOST,
+        ))
@@ -2,6 +2,7 @@ from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
 from .models import UserProfile
+from .profile_pictures import ImageTooLarge, check_dimensions, schedule_processing
 
 class RegistrationForm(UserCreationForm):
     email = forms.EmailField(required=True)
@@ -33,6 +34,24 @@ class UserProfileForm(forms.ModelForm):
         self.fields['bio'].widget.attrs.update({'class': 'form-control'})
         self.fields['profile_picture'].widget.attrs.update({'class': 'form-control-file'})
 
+    def clean_profile_picture(self):
+        picture = self.cleaned_data.get('profile_picture')
+        # ImageField has read the upload's header and left the (undecoded) image on it.
+        image = getattr(picture, 'image', None)
+        if image is not None:
+            try:
+                check_dimensions(image.size)
+            except ImageTooLarge:
+                raise forms.ValidationError('This image is too large. Please upload a smaller picture.')
+        return picture
+
+    def save(self, commit=True):
+        profile = super().save(commit)
+        if commit and 'profile_picture' in self.changed_data:
+            # Resizing happens off the request thread; pages show the upload until it's done.
+            schedule_processing(profile.pk)
+        return profile
+
 class UserUpdateForm(forms.ModelForm):
     email = forms.EmailField(required=True)
 
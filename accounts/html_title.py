@@ -0,0 +1,156 @@
+"""
+Streaming <title> extraction for search results.
+
+Reads a streamed ``requests`` (or ``httpx``) response a chunk at a time and stops as soon as the
+closing ``</title>`` has arrived (or ``max_bytes`` have been read), so large pages
+are never downloaded or parsed in full. Well-formed titles are pulled out with a
+regex; BeautifulSoup is only used when the markup around the title is malformed.
+"""
+import codecs
+import html
+import re
+
+from bs4 import BeautifulSoup
+
+DEFAULT_MAX_BYTES = 256 * 1024
+CHUNK_SIZE = 8 * 1024
+MAX_TITLE_MARKUP = 4 * 1024  # How much markup after <title> the fallback parser looks at
+
+_TITLE_CLOSE_RE = re.compile(rb'</title\s*>', re.IGNORECASE)
+_TITLE_RE = re.compile(r'<title[^>]*>(.*?)</title\s*>', re.IGNORECASE | re.DOTALL)
+_HEAD_END_RE = re.compile(r'</head|<body', re.IGNORECASE)
+_META_CHARSET_RE = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([a-zA-Z0-9_:.-]+)', re.IGNORECASE)
+_BOMS = (
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+
+class HeadReader:
+    """
+    Collects body chunks until the first ``</title>`` has arrived or ``max_bytes``
+    are buffered. Shared by the sync (requests) and async (httpx) readers.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.buffer = bytearray()
+
+    def feed(self, chunk):
+        """Add ``chunk``; returns True once no more data is needed."""
+        # Only rescan the tail of the buffer that could contain a new match.
+        scan_from = max(0, len(self.buffer) - 32)
+        self.buffer += chunk
+        return bool(_TITLE_CLOSE_RE.search(self.buffer, scan_from)) or len(self.buffer) >= self.max_bytes
+
+    @property
+    def data(self):
+        return bytes(self.buffer[:self.max_bytes])
+
+
+def read_head(response, max_bytes=DEFAULT_MAX_BYTES):
+    """
+    Read ``response`` until the first ``</title>`` or ``max_bytes``, whichever comes
+    first, and return the bytes read.
+    """
+    reader = HeadReader(max_bytes)
+    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+        if chunk and reader.feed(chunk):
+            break
+    return reader.data
+
+
+async def aread_head(chunks, max_bytes=DEFAULT_MAX_BYTES):
+    """
+    Async counterpart of read_head(). Takes the body as an async iterator of chunks
+    (e.g. an ``httpx`` response's ``aiter_bytes()``), which the caller can go on
+    consuming afterwards; httpx won't restart a stream that was broken out of.
+    """
+    reader = HeadReader(max_bytes)
+    async for chunk in chunks:
+        if chunk and reader.feed(chunk):
+            break
+    return reader.data
+
+
+def _is_known_encoding(name):
+    try:
+        codecs.lookup(name)
+    except LookupError:
+        return False
+    return True
+
+
+def detect_encoding(data, content_type=None):
+    """
+    Pick the charset for ``data``: a BOM wins, then the Content-Type header, then a
+    ``<meta charset>`` / ``http-equiv`` declaration. Returns None if nothing is declared.
+    """
+    for bom, encoding in _BOMS:
+        if data.startswith(bom):
+            return encoding
+    if content_type:
+        for param in content_type.split(';')[1:]:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'charset':
+                charset = value.strip().strip('"\'')
+                if _is_known_encoding(charset):
+                    return charset
+    match = _META_CHARSET_RE.search(data)
+    if match:
+        charset = match.group(1).decode('ascii', 'ignore')
+        if _is_known_encoding(charset):
+            return charset
+    return None
+
+
+def decode(data, content_type=None):
+    encoding = detect_encoding(data, content_type)
+    if encoding:
+        return data.decode(encoding, errors='replace')
+    try:
+        return data.decode('utf-8')
+    except UnicodeDecodeError:
+        # Undeclared and not UTF-8: windows-1252 is what browsers assume.
+        return data.decode('windows-1252', errors='replace')
+
+
+def _clean(title):
+    return ' '.join(html.unescape(title).split())
+
+
+def title_from_text(text):
+    """Return the page title found in ``text`` (possibly a truncated document), or None."""
+    match = _TITLE_RE.search(text)
+    if match and '<' not in match.group(1):
+        return _clean(match.group(1)) or None
+    start = match.start() if match else text.lower().find('<title')
+    if start == -1:
+        return None
+
+    # Malformed markup (unclosed title, tags inside it, ...): let BeautifulSoup sort
+    # it out, parsing only the title's neighbourhood (up to the end of <head>)
+    # rather than the whole page.
+    snippet = text[start:start + MAX_TITLE_MARKUP]
+    head_end = _HEAD_END_RE.search(snippet)
+    if head_end:
+        snippet = snippet[:head_end.start()]
+    title_tag = BeautifulSoup(snippet, 'html.parser').find('title')
+    if title_tag is None:
+        return None
+    return _clean(title_tag.get_text()) or None
+
+
+def title_from_bytes(data, content_type=None):
+    return title_from_text(decode(data, content_type))
+
+
+def extract_title(response, max_bytes=DEFAULT_MAX_BYTES):
+    """
+    Return the ``<title>`` of a streamed ``requests`` response (opened with
+    ``stream=True``), reading at most ``max_bytes`` of the body. Returns None if the
+    page has no title within that many bytes.
+    """
+    data = read_head(response, max_bytes)
+    return title_from_bytes(data, response.headers.get('Content-Type'))
@@ -0,0 +1,89 @@
+"""
+Process-wide HTTP client for outbound requests (search result pages).
+
+All fetches share one ``requests.Session`` so connections (and TLS sessions) are
+kept alive and reused instead of being set up for every URL. Pool sizes and
+timeouts come from the OUTBOUND_HTTP_* settings.
+"""
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+DRAIN_CHUNK_SIZE = 16 * 1024
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Return the shared session, creating it on first use."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=settings.OUTBOUND_HTTP_POOL_HOSTS,
+                pool_maxsize=settings.OUTBOUND_HTTP_POOL_PER_HOST,
+                pool_block=settings.OUTBOUND_HTTP_POOL_BLOCK,
+                max_retries=0,
+            )
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.headers.update(DEFAULT_HEADERS)
+            _session = session
+        return _session
+
+
+def get_timeout():
+    """``(connect, read)`` timeout tuple for ``requests``."""
+    return (settings.OUTBOUND_HTTP_CONNECT_TIMEOUT, settings.OUTBOUND_HTTP_READ_TIMEOUT)
+
+
+def release(response, max_drain=None):
+    """
+    Hand a streamed response's connection back to the pool.
+
+    A connection can only be reused once its body has been read to the end, so a
+    small unread remainder (up to ``max_drain`` bytes) is read off and discarded.
+    Anything larger is cheaper to abandon: the connection is closed instead.
+    """
+    if max_drain is None:
+        max_drain = settings.OUTBOUND_HTTP_DRAIN_BYTES
+    raw = response.raw
+    try:
+        length = int(response.headers['Content-Length'])
+    except (KeyError, ValueError):
+        length = None
+    try:
+        if length is None or length - raw.tell() <= max_drain:
+            drained = 0
+            while drained <= max_drain:
+                chunk = raw.read(DRAIN_CHUNK_SIZE, decode_content=False)
+                if not chunk:
+                    break
+                drained += len(chunk)
+    except Exception:
+        pass  # Closing below takes care of a broken connection
+    finally:
+        response.close()
+
+
+def close_session():
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+@receiver(setting_changed)
+def _reset_session(setting, **kwargs):
+    if setting.startswith('OUTBOUND_HTTP_'):
+        close_session()
@@ -0,0 +1,37 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.cache import caches
+
+from accounts.tiered_cache import STATS_METRICS, TieredCache, read_stats, reset_stats
+
+
+class Command(BaseCommand):
+    help = "Show hit rates per cache namespace, summed over every process using the tiered cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--alias', default='default', help='CACHES entry to report on.')
+        parser.add_argument('--json', action='store_true', help='Print the numbers as JSON.')
+        parser.add_argument('--reset', action='store_true', help='Zero the counters after printing them.')
+
+    def handle(self, *args, **options):
+        cache = caches[options['alias']]
+        if not isinstance(cache, TieredCache):
+            raise CommandError(f"CACHES['{options['alias']}'] is not a TieredCache.")
+        stats = read_stats(cache)
+        if options['json']:
+            self.stdout.write(json.dumps(stats, indent=2))
+        elif not stats:
+            self.stdout.write('No cache activity recorded yet.')
+        else:
+            columns = ('namespace', 'hit_rate', 'local_hit_rate') + STATS_METRICS
+            rows = [columns] + [
+                (namespace,) + tuple('-' if row[c] is None else f'{row[c]:.1%}' if 'rate' in c else str(row[c])
+                                     for c in columns[1:])
+                for namespace, row in stats.items()
+            ]
+            widths = [max(len(row[i]) for row in rows) for i in range(len(columns))]
+            for row in rows:
+                self.stdout.write('  '.join(value.ljust(width) for value, width in zip(row, widths)).rstrip())
+        if options['reset']:
+            reset_stats(cache)
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from accounts.media_storage import BATCH_SIZE, collect_garbage, recount_references
+
+
+class Command(BaseCommand):
+    help = "Delete uploaded files that no profile has referred to for MEDIA_BLOB_GRACE seconds (run it from cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Files deleted per transaction.')
+        parser.add_argument('--grace', type=int, default=None, help='Override MEDIA_BLOB_GRACE (seconds).')
+        parser.add_argument('--recount', action='store_true',
+                            help='Recompute reference counts from the profiles first.')
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+        if options['recount']:
+            self.stdout.write(f'Corrected {recount_references(batch_size)} reference counts.')
+        files, freed = collect_garbage(batch_size, options['grace'])
+        self.stdout.write(f'Deleted {files} unreferenced files ({freed} bytes).')
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from accounts.models import UserProfile
+from accounts.profile_pictures import process_profile_picture
+
+
+class Command(BaseCommand):
+    help = ("Clean and resize profile pictures that have no up-to-date variants "
+            "(uploads from before the pipeline existed, or whose background run failed).")
+
+    def handle(self, *args, **options):
+        profiles = (UserProfile.objects.exclude(profile_picture='').exclude(profile_picture__isnull=True)
+                    .order_by('pk').values_list('pk', flat=True))
+        failed = 0
+        for pk in profiles.iterator():
+            try:
+                process_profile_picture(pk)
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f'Profile {pk}: {e}')
+        self.stdout.write(f'Done, {failed} failed.')
@@ -0,0 +1,66 @@
+import multiprocessing
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+def _worker_process(poll_interval, burst):
+    import django
+    django.setup()  # No-op after fork; needed for spawned processes (macOS, Windows)
+    from accounts.search_jobs import work
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+    work(stop, poll_interval=poll_interval, burst=burst)
+
+
+class Command(BaseCommand):
+    help = "Run background web search workers (used when SEARCH_BACKGROUND is on)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=2, help='Number of worker processes.')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to wait between checks of an empty queue.')
+        parser.add_argument('--burst', action='store_true', help='Exit once the queue is empty.')
+
+    def handle(self, *args, **options):
+        from accounts.search_jobs import work
+
+        processes = max(1, options['processes'])
+        poll_interval = options['poll_interval']
+        burst = options['burst']
+
+        if processes == 1:
+            stop = threading.Event()
+            signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+            try:
+                processed = work(stop, poll_interval=poll_interval, burst=burst)
+            except KeyboardInterrupt:
+                return
+            self.stdout.write(f"Processed {processed} search job(s).")
+            return
+
+        # Children must open their own database connections.
+        connections.close_all()
+        children = [
+            multiprocessing.Process(target=_worker_process, args=(poll_interval, burst), name=f'search-worker-{i}')
+            for i in range(processes)
+        ]
+        for child in children:
+            child.start()
+        # Pass a SIGTERM on to the workers; each stops after its current job.
+        signal.signal(signal.SIGTERM, lambda signum, frame: [child.terminate() for child in children])
+        self.stdout.write(f"Started {processes} search workers.")
+        try:
+            for child in children:
+                child.join()
+        except KeyboardInterrupt:
+            # Ctrl-C reaches the children too; wait for them to finish their current job.
+            for child in children:
+                child.join()
+        finally:
+            for child in children:
+                if child.is_alive():
+                    child.terminate()
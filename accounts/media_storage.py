@@ -0,0 +1,171 @@
+"""
+Content-addressed, deduplicated storage for uploaded media.
+
+ContentAddressedStorage (the default storage, see STORAGES) hashes an upload
+while streaming it to a temporary file, then names it after its SHA-256:
+``profile_pics/me.jpg`` is stored as ``profile_pics/3f/3fa9...c1.jpg``. If that
+file already exists the temporary copy is dropped, so re-uploads and identical
+pictures take no extra disk.
+
+Every stored file has a MediaBlob row counting the UserProfile rows that refer
+to it (their picture or one of its variants). Profile saves and deletes adjust
+the counts by what changed (the signal handlers below, connected in
+AccountsConfig.ready); nothing is deleted on the spot, because another profile
+may share the file. ``manage.py collect_media`` deletes the files that have been
+unreferenced for MEDIA_BLOB_GRACE seconds, a batch per transaction, and can
+recount the references from scratch.
+"""
+import hashlib
+import os
+import tempfile
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import MediaBlob, UserProfile
+
+BATCH_SIZE = 500
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def get_available_name(self, name, max_length=None):
+        # The final name comes from the content (see _save), so it never clashes.
+        return name
+
+    def _save(self, name, content):
+        prefix, ext = os.path.dirname(name), os.path.splitext(name)[1].lower()
+        directory = self.path(prefix)
+        os.makedirs(directory, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as temp:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    size += len(chunk)
+                    temp.write(chunk)
+            hexdigest = digest.hexdigest()
+            name = f'{prefix}/{hexdigest[:2]}/{hexdigest}{ext}' if prefix else f'{hexdigest[:2]}/{hexdigest}{ext}'
+            with transaction.atomic():
+                # Touch the row first: on PostgreSQL this waits for a collect_media batch
+                # deleting the same blob to finish, so the file is put back below.
+                if not MediaBlob.objects.filter(name=name).update(touched=timezone.now()):
+                    MediaBlob.objects.get_or_create(name=name, defaults={'size': size, 'touched': timezone.now()})
+                full_path = self.path(name)
+                if not os.path.exists(full_path):
+                    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                    os.replace(temp_path, full_path)
+                    if self.file_permissions_mode is not None:
+                        os.chmod(full_path, self.file_permissions_mode)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return name
+
+
+def retain(names):
+    """Count one more reference to each stored file in ``names``."""
+    names = set(filter(None, names))
+    if not names:
+        return
+    if MediaBlob.objects.filter(name__in=names).update(refcount=F('refcount') + 1) < len(names):
+        known = set(MediaBlob.objects.filter(name__in=names).values_list('name', flat=True))
+        _add_untracked({name: 1 for name in names - known})
+
+
+def _add_untracked(refcounts):
+    # Rows for files stored before this storage was in use.
+    storage = UserProfile._meta.get_field('profile_picture').storage
+    blobs = []
+    for name, refcount in refcounts.items():
+        try:
+            size = storage.size(name)
+        except OSError:
+            size = 0
+        blobs.append(MediaBlob(name=name, size=size, refcount=refcount, touched=timezone.now()))
+    MediaBlob.objects.bulk_create(blobs, ignore_conflicts=True)
+
+
+def release(names):
+    """Count one reference fewer to each stored file in ``names``; files reaching zero start their grace period."""
+    names = set(filter(None, names))
+    if names:
+        MediaBlob.objects.filter(name__in=names, refcount__gt=0).update(
+            refcount=F('refcount') - 1, touched=timezone.now())
+
+
+def adjust_references(old, new):
+    retain(new - old)
+    release(old - new)
+
+
+def profile_pre_save(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding or hasattr(instance, '_loaded_media_files'):
+        return
+    # Not loaded from the database (or loaded without its file fields): read what the row refers to now.
+    stored = UserProfile.objects.filter(pk=instance.pk).only('profile_picture', 'picture_variants').first()
+    instance._loaded_media_files = stored.media_files() if stored else set()
+
+
+def profile_post_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    new = instance.media_files()
+    adjust_references(set() if created else instance._loaded_media_files, new)
+    instance._loaded_media_files = new
+
+
+def profile_post_delete(sender, instance, **kwargs):
+    release(instance.media_files())
+
+
+def collect_garbage(batch_size=BATCH_SIZE, grace=None):
+    """
+    Delete the stored files that no profile has referred to for ``grace`` seconds
+    (MEDIA_BLOB_GRACE by default), ``batch_size`` per transaction. Returns the
+    number of files and bytes freed.
+    """
+    grace = settings.MEDIA_BLOB_GRACE if grace is None else grace
+    cutoff = timezone.now() - timedelta(seconds=grace)
+    storage = UserProfile._meta.get_field('profile_picture').storage
+    files = freed = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                MediaBlob.objects.select_for_update(skip_locked=True)
+                .filter(refcount=0, touched__lt=cutoff).order_by('pk')[:batch_size]
+            )
+            if not batch:
+                return files, freed
+            MediaBlob.objects.filter(pk__in=[blob.pk for blob in batch]).delete()
+            for blob in batch:
+                storage.delete(blob.name)
+        files += len(batch)
+        freed += sum(blob.size for blob in batch)
+
+
+def recount_references(batch_size=BATCH_SIZE):
+    """
+    Recompute every MediaBlob refcount from the UserProfile rows, e.g. after
+    profiles were changed with QuerySet.update(). Returns how many counts changed.
+    """
+    counts = Counter()
+    for profile in UserProfile.objects.only('profile_picture', 'picture_variants').iterator(chunk_size=batch_size):
+        counts.update(profile.media_files())
+    changed = []
+    now = timezone.now()
+    for blob in MediaBlob.objects.iterator(chunk_size=batch_size):
+        refcount = counts.pop(blob.name, 0)
+        if blob.refcount != refcount:
+            blob.refcount = refcount
+            blob.touched = now
+            changed.append(blob)
+    MediaBlob.objects.bulk_update(changed, ['refcount', 'touched'], batch_size=batch_size)
+    _add_untracked(counts) # Referenced files without a row
+    return len(changed) + len(counts)
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_searchjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RateLimitState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('next_free', models.FloatField(default=0.0)),
+                ('blocked_until', models.FloatField(default=0.0)),
+                ('failures', models.PositiveIntegerField(default=0)),
+                ('version', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+    ]
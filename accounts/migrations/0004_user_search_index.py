@@ -0,0 +1,91 @@
+"""
+Index-backed substring search on auth_user's username and email (see accounts/user_search.py).
+
+PostgreSQL: trigram GIN indexes on the exact expressions Django's ``icontains``
+compares (``UPPER(col::text)``), so ``LIKE '%term%'`` becomes an index scan.
+
+SQLite: an external-content FTS5 table with the trigram tokenizer (SQLite 3.34+),
+kept in step with auth_user by triggers. It stores only the index, not a second
+copy of the rows. Skipped where FTS5 or the trigram tokenizer isn't available.
+"""
+import sqlite3
+
+from django.db import migrations
+
+SQLITE_TABLE = 'accounts_user_trigram'
+
+SQLITE_FORWARD = [
+    f"CREATE VIRTUAL TABLE {SQLITE_TABLE} USING fts5(username, email, content='auth_user', content_rowid='id', tokenize='trigram')",
+    f"""CREATE TRIGGER {SQLITE_TABLE}_insert AFTER INSERT ON auth_user BEGIN
+        INSERT INTO {SQLITE_TABLE}(rowid, username, email) VALUES (new.id, new.username, new.email);
+    END""",
+    f"""CREATE TRIGGER {SQLITE_TABLE}_delete AFTER DELETE ON auth_user BEGIN
+        INSERT INTO {SQLITE_TABLE}({SQLITE_TABLE}, rowid, username, email) VALUES ('delete', old.id, old.username, old.email);
+    END""",
+    f"""CREATE TRIGGER {SQLITE_TABLE}_update AFTER UPDATE OF username, email ON auth_user BEGIN
+        INSERT INTO {SQLITE_TABLE}({SQLITE_TABLE}, rowid, username, email) VALUES ('delete', old.id, old.username, old.email);
+        INSERT INTO {SQLITE_TABLE}(rowid, username, email) VALUES (new.id, new.username, new.email);
+    END""",
+    f"INSERT INTO {SQLITE_TABLE}({SQLITE_TABLE}) VALUES ('rebuild')",
+]
+
+SQLITE_BACKWARD = [
+    f'DROP TRIGGER IF EXISTS {SQLITE_TABLE}_insert',
+    f'DROP TRIGGER IF EXISTS {SQLITE_TABLE}_delete',
+    f'DROP TRIGGER IF EXISTS {SQLITE_TABLE}_update',
+    f'DROP TABLE IF EXISTS {SQLITE_TABLE}',
+]
+
+POSTGRESQL_FORWARD = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS accounts_user_username_trgm ON auth_user USING gin (UPPER(username::text) gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS accounts_user_email_trgm ON auth_user USING gin (UPPER(email::text) gin_trgm_ops)',
+]
+
+POSTGRESQL_BACKWARD = [
+    'DROP INDEX IF EXISTS accounts_user_username_trgm',
+    'DROP INDEX IF EXISTS accounts_user_email_trgm',
+]
+
+
+def sqlite_has_trigram_tokenizer():
+    try:
+        sqlite3.connect(':memory:').execute("CREATE VIRTUAL TABLE probe USING fts5(value, tokenize='trigram')")
+    except sqlite3.OperationalError:
+        return False
+    return True
+
+
+def _run(schema_editor, statements):
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def create_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        _run(schema_editor, POSTGRESQL_FORWARD)
+    elif vendor == 'sqlite' and sqlite_has_trigram_tokenizer():
+        _run(schema_editor, SQLITE_FORWARD)
+
+
+def drop_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        _run(schema_editor, POSTGRESQL_BACKWARD)
+    elif vendor == 'sqlite':
+        _run(schema_editor, SQLITE_BACKWARD)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_ratelimitstate'),
+        # After the last auth_user change: SQLite drops a table's triggers when a
+        # migration rebuilds it (accounts.user_search re-creates them if that happens).
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,40 @@
+"""
+Indexes for admin_dashboard's keyset pagination over pending (inactive) users:
+one per sortable column, with id as the tiebreaker, so each page is an index
+range scan. On PostgreSQL and SQLite they are partial indexes covering only the
+inactive users, whose predicate matches the ``NOT is_active`` Django generates for
+``is_active=False``; elsewhere they are composite indexes led by is_active.
+"""
+from django.db import migrations
+
+COLUMNS = ['username', 'email', 'date_joined']
+
+
+def create_indexes(apps, schema_editor):
+    partial = schema_editor.connection.vendor in ('postgresql', 'sqlite')
+    for column in COLUMNS:
+        if partial:
+            schema_editor.execute(
+                f'CREATE INDEX accounts_pending_{column} ON auth_user ({column}, id) WHERE NOT is_active'
+            )
+        else:
+            schema_editor.execute(f'CREATE INDEX accounts_pending_{column} ON auth_user (is_active, {column}, id)')
+
+
+def drop_indexes(apps, schema_editor):
+    for column in COLUMNS:
+        if schema_editor.connection.vendor == 'mysql':
+            schema_editor.execute(f'DROP INDEX accounts_pending_{column} ON auth_user')
+        else:
+            schema_editor.execute(f'DROP INDEX accounts_pending_{column}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_user_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_mediablob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='searchjob',
+            name='not_before',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -7,21 +7,120 @@ class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     bio = models.TextField(blank=True, null=True)
     profile_picture = models.ImageField(upload_to='profile_pics/', blank=True, null=True)
+    # Resized copies of profile_picture, written by accounts.profile_pictures:
+    # {"source": picture name, "webp": {size: name}, "jpeg": {size: name}}.
+    picture_variants = models.JSONField(default=dict, blank=True, editable=False)
     # Add other fields as needed, e.g., birth_date, location, etc.
 
     def __str__(self):
         return f'{self.user.username} Profile'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember which stored files the row referenced, so that a save can
+        # adjust MediaBlob refcounts by the difference (accounts/media_storage.py).
+        if {'profile_picture', 'picture_variants'} <= set(field_names):
+            instance._loaded_media_files = instance.media_files()
+        return instance
+
+    def media_files(self):
+        """Names of the stored files this profile refers to: its picture and the picture's variants."""
+        names = {name for key, by_size in self.picture_variants.items() if key != 'source' for name in by_size.values()}
+        if self.profile_picture:
+            names.add(self.profile_picture.name)
+        return names
+
 @receiver(post_save, sender=User)
-def create_or_update_user_profile(sender, instance, created, **kwargs):
+def create_or_update_user_profile(sender, instance, created, update_fields=None, **kwargs):
     """
-    Signal to create or update the user profile whenever a User instance is saved.
+    Create the profile along with a new user. Later saves cost no profile queries:
+    nothing on the profile derives from the user, so the profile is only saved when
+    a full User.save() is made with the profile already loaded (and possibly changed)
+    on the instance. Partial saves such as the ``last_login`` update on every login
+    never touch it. Code that needs a profile which may be missing (older accounts,
+    bulk-created users) should use ``UserProfile.objects.get_or_create(user=...)``.
     """
     if created:
         UserProfile.objects.create(user=instance)
-    else:
-        # Ensure profile exists, create if it somehow got deleted
-        UserProfile.objects.get_or_create(user=instance)
-        # If you want to update profile fields based on user fields, do it here.
-        # For example: instance.profile.some_field = instance.some_user_field
-    instance.profile.save()
+    elif update_fields is None and User.profile.is_cached(instance):
+        instance.profile.save()
+
+
+class SearchJob(models.Model):
+    """
+    A web search queued by search_view (SEARCH_BACKGROUND) and run by a
+    ``run_search_workers`` process. ``results`` fills in as titles resolve.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='search_jobs')
+    query = models.CharField(max_length=255)
+    lang = models.CharField(max_length=10, default='en')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    results = models.JSONField(default=list, blank=True) # [{'url': ..., 'title': ...}]
+    error_message = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    worker = models.CharField(max_length=100, blank=True) # host:pid of the worker running it
+    not_before = models.DateTimeField(null=True, blank=True) # Set when requeued to wait for the upstream
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True) # Doubles as the running worker's heartbeat
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f'{self.query} ({self.status})'
+
+    @property
+    def is_finished(self):
+        return self.status in (self.DONE, self.FAILED)
+
+
+class RateLimitState(models.Model):
+    """
+    Shared state of an UpstreamGovernor (accounts/rate_governor.py) so that every
+    worker process draws from the same token bucket. Updated optimistically:
+    a writer only succeeds if ``version`` is unchanged since it read the row.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    next_free = models.FloatField(default=0.0) # Unix time the bucket's next slot frees up
+    blocked_until = models.FloatField(default=0.0) # Back-off after upstream errors
+    failures = models.PositiveIntegerField(default=0) # Consecutive upstream errors
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return self.name
+
+
+class MediaBlob(models.Model):
+    """
+    A file in the content-addressed media storage (accounts/media_storage.py),
+    named after its SHA-256. ``refcount`` is how many UserProfile rows refer to
+    it; files left at zero for longer than MEDIA_BLOB_GRACE are deleted in
+    batches by ``manage.py collect_media``.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField()
+    refcount = models.PositiveIntegerField(default=0)
+    touched = models.DateTimeField() # Last time the file was stored or lost a reference; starts the grace period
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['touched'], condition=models.Q(refcount=0), name='mediablob_unreferenced_idx'),
+        ]
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,109 @@
+"""
+Keyset (cursor) pagination.
+
+Instead of COUNT(*) plus OFFSET, each page asks for the rows just after (or
+before) the last row the user saw, ordered by the sort column with the primary
+key as tiebreaker. With an index on (sort column, id) every page is an index range
+scan, however deep it is. The cursors are opaque URL-safe tokens holding the
+boundary row's sort value and id.
+"""
+import base64
+import json
+
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(value, pk):
+    raw = json.dumps([value.isoformat() if hasattr(value, 'isoformat') else value, pk])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, field):
+    """Return ``(value, pk)`` from ``token``, with ``value`` converted for ``field``; raises InvalidCursor."""
+    try:
+        value, pk = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        return field.to_python(value), int(pk)
+    except Exception as e:
+        raise InvalidCursor(token) from e
+
+
+class KeysetPage:
+    """One page of results, with cursors for the pages either side (None where there is none)."""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+def _beyond(field_name, value, pk, descending):
+    # "(field, id) > (value, pk)" (or < when descending), written so the sort
+    # column gets a plain range condition the index can seek to.
+    if descending:
+        return Q(**{f'{field_name}__lte': value}) & ~Q(**{field_name: value, 'pk__gte': pk})
+    return Q(**{f'{field_name}__gte': value}) & ~Q(**{field_name: value, 'pk__lte': pk})
+
+
+def keyset_page(queryset, field_name, descending=False, per_page=15, after=None, before=None):
+    """
+    Return the KeysetPage of ``queryset`` ordered by ``field_name`` (then pk) that
+    starts after the ``after`` cursor, or ends before the ``before`` cursor, or the
+    first page if neither is given (or the cursor is invalid). One extra row is
+    fetched to tell whether there is another page; nothing is counted.
+    """
+    field = queryset.model._meta.get_field(field_name)
+    order = [f'-{field_name}', '-pk'] if descending else [field_name, 'pk']
+    reverse = [name[1:] if name.startswith('-') else f'-{name}' for name in order]
+
+    def cursor(obj):
+        return encode_cursor(getattr(obj, field_name), obj.pk)
+
+    def first_page():
+        rows = list(queryset.order_by(*order)[:per_page + 1])
+        return KeysetPage(rows[:per_page], next_cursor=cursor(rows[per_page - 1]) if len(rows) > per_page else None)
+
+    def page_before(rows_before, at_end=False):
+        rows = list(rows_before.order_by(*reverse)[:per_page + 1])
+        if len(rows) <= per_page:
+            return first_page() # Nothing before it: show a full first page instead
+        rows = rows[:per_page][::-1]
+        return KeysetPage(rows, next_cursor=None if at_end else cursor(rows[-1]), previous_cursor=cursor(rows[0]))
+
+    try:
+        if before:
+            value, pk = decode_cursor(before, field)
+            return page_before(queryset.filter(_beyond(field_name, value, pk, not descending)))
+        if not after:
+            return first_page()
+        value, pk = decode_cursor(after, field)
+    except InvalidCursor:
+        return first_page()
+
+    rows = list(queryset.filter(_beyond(field_name, value, pk, descending)).order_by(*order)[:per_page + 1])
+    if not rows:
+        # Past the end, e.g. the rest were approved meanwhile: show the last page.
+        return page_before(queryset, at_end=True)
+    return KeysetPage(
+        rows[:per_page],
+        next_cursor=cursor(rows[per_page - 1]) if len(rows) > per_page else None,
+        previous_cursor=cursor(rows[0]),
+    )
@@ -0,0 +1,175 @@
+"""
+Profile picture processing.
+
+Uploads are saved as sent; once the upload is committed, a background thread
+(schedule_processing) takes over:
+
+* the upload is replaced by a re-encoded copy no larger than
+  PROFILE_PICTURE_MAX_EDGE with all metadata (EXIF, GPS, comments, ICC) dropped,
+  after applying its EXIF orientation;
+* square variants are rendered at each of PROFILE_PICTURE_SIZES, in WebP plus a
+  JPEG fallback, and recorded in ``UserProfile.picture_variants``.
+
+Templates show them with ``{% profile_picture %}`` (templatetags/profile_pictures.py),
+which falls back to the upload itself until its variants exist.
+
+Decoding is bounded: Pillow reads an image's dimensions from its header, and
+anything over PROFILE_PICTURE_MAX_PIXELS is refused (by UserProfileForm at upload,
+and again here) before its pixels are decoded.
+"""
+import io
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# (key in picture_variants, Pillow format, file extension, MIME type), in order of preference.
+VARIANT_FORMATS = (
+    ('webp', 'WEBP', 'webp', 'image/webp'),
+    ('jpeg', 'JPEG', 'jpg', 'image/jpeg'),
+)
+
+
+class ImageTooLarge(ValueError):
+    pass
+
+
+def check_dimensions(size):
+    """Raise ImageTooLarge if an image of ``size`` (width, height) has more pixels than allowed."""
+    width, height = size
+    if width * height > settings.PROFILE_PICTURE_MAX_PIXELS:
+        raise ImageTooLarge(f'{width}x{height} image exceeds PROFILE_PICTURE_MAX_PIXELS')
+
+
+def _open(file):
+    image = Image.open(file)
+    check_dimensions(image.size)
+    image = ImageOps.exif_transpose(image)
+    has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+    image = image.convert('RGBA' if has_alpha else 'RGB')
+    image.info = {}
+    return image
+
+
+def _encode(image, pil_format, quality=None):
+    if pil_format == 'JPEG' and image.mode == 'RGBA':
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    options = {'optimize': True} if pil_format != 'WEBP' else {'method': 4}
+    if quality is not None:
+        options['quality'] = quality
+    buffer = io.BytesIO()
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def render(file):
+    """
+    Decode the image in ``file`` and return ``(original, ext, variants)``: the
+    cleaned original's bytes and extension, and ``{format key: {size: bytes}}``.
+    Raises ImageTooLarge, or Pillow's errors for files that aren't images.
+    """
+    image = _open(file)
+    max_edge = settings.PROFILE_PICTURE_MAX_EDGE
+    if max(image.size) > max_edge:
+        image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+    if image.mode == 'RGBA':
+        original, ext = _encode(image, 'PNG'), 'png'
+    else:
+        original, ext = _encode(image, 'JPEG', 90), 'jpg'
+
+    sizes = sorted(settings.PROFILE_PICTURE_SIZES, reverse=True)
+    quality = settings.PROFILE_PICTURE_QUALITY
+    variants = {key: {} for key, *_ in VARIANT_FORMATS}
+    # Crop to a square once, at the largest size, and scale each smaller size from the previous one.
+    square = ImageOps.fit(image, (sizes[0], sizes[0]), Image.LANCZOS)
+    for size in sizes:
+        if square.width != size:
+            square = square.resize((size, size), Image.LANCZOS)
+        for key, pil_format, _, _ in VARIANT_FORMATS:
+            variants[key][size] = _encode(square, pil_format, quality)
+    return original, ext, variants
+
+
+def process_profile_picture(profile_pk):
+    """
+    Clean and render the variants of a profile's current picture. Does nothing if
+    they are already up to date; if the picture is replaced while this runs, the
+    work is thrown away and the newer upload's own run wins. Files no longer
+    referenced are left to ``manage.py collect_media`` (accounts/media_storage.py).
+    """
+    from .media_storage import adjust_references
+    from .models import UserProfile
+
+    profile = UserProfile.objects.filter(pk=profile_pk).first()
+    if profile is None:
+        return
+    field = profile.profile_picture
+    previous = profile.picture_variants or {}
+    if not field:
+        cleared = UserProfile.objects.filter(Q(profile_picture='') | Q(profile_picture__isnull=True), pk=profile_pk)
+        with transaction.atomic():
+            if previous and cleared.update(picture_variants={}):
+                adjust_references(profile.media_files(), set())
+        return
+    source = field.name
+    if previous.get('source') == source:
+        return
+
+    with field.open('rb') as file:
+        original, ext, rendered = render(file)
+
+    storage = field.storage
+    base = f'{field.field.upload_to}avatar'
+    new_source = storage.save(f'{base}.{ext}', ContentFile(original))
+    variants = {'source': new_source}
+    for key, _, extension, _ in VARIANT_FORMATS:
+        variants[key] = {str(size): storage.save(f'{base}-{size}.{extension}', ContentFile(data))
+                         for size, data in rendered[key].items()}
+
+    with transaction.atomic():
+        # Conditional update: only if the picture is still the one that was processed.
+        if UserProfile.objects.filter(pk=profile_pk, profile_picture=source).update(
+                profile_picture=new_source, picture_variants=variants):
+            updated = UserProfile(profile_picture=new_source, picture_variants=variants)
+            adjust_references(profile.media_files(), updated.media_files())
+
+
+def _run(profile_pk):
+    try:
+        process_profile_picture(profile_pk)
+    except Exception:
+        logger.exception('Processing the picture of profile %s failed', profile_pk)
+    finally:
+        close_old_connections()
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def schedule_processing(profile_pk):
+    """
+    Process the profile's picture on a background thread once the current
+    transaction commits (inline if PROFILE_PICTURE_WORKERS is 0).
+    """
+    def submit():
+        global _executor
+        workers = settings.PROFILE_PICTURE_WORKERS
+        if workers <= 0:
+            process_profile_picture(profile_pk)
+            return
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='profile-picture')
+        _executor.submit(_run, profile_pk)
+
+    transaction.on_commit(submit)
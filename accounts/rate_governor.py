@@ -0,0 +1,227 @@
+"""
+Rate governor for upstream search calls.
+
+Every search first reserves a slot in a token bucket (SEARCH_RATE calls per
+second, bursts of up to SEARCH_RATE_BURST) whose state is shared by all worker
+processes. The caller waits for its slot, but if that wait would exceed
+SEARCH_RATE_MAX_WAIT it gets UpstreamBusy straight away instead of tying up the
+worker. Upstream errors pause everyone's searches with exponential back-off.
+"""
+import asyncio
+import functools
+import os
+import threading
+import time
+import logging
+from collections import deque
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from rubik.db_router import without_pinning
+
+from .models import RateLimitState
+
+logger = logging.getLogger(__name__)
+
+
+class UpstreamBusy(Exception):
+    """The next free slot is further away than the caller is allowed to wait."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"upstream search is busy, next slot in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+_INITIAL_STATE = {'next_free': 0.0, 'blocked_until': 0.0, 'failures': 0}
+
+
+class LocalRateState:
+    """In-process state: every worker process gets the whole rate to itself."""
+    shared = False
+
+    def __init__(self):
+        self._state = dict(_INITIAL_STATE)
+        self._lock = threading.Lock()
+
+    def update(self, change):
+        """
+        Apply ``change(state) -> (new_state or None, result)`` atomically and return
+        ``result``. A None ``new_state`` leaves the state as it was.
+        """
+        with self._lock:
+            new_state, result = change(dict(self._state))
+            if new_state is not None:
+                self._state = new_state
+            return result
+
+
+class DatabaseRateState:
+    """State kept in a RateLimitState row, shared by every process using the database."""
+    shared = True
+    max_attempts = 50
+
+    def __init__(self, name):
+        self.name = name
+
+    def update(self, change):
+        # The governor's own bookkeeping: a search shouldn't pin its client to the primary.
+        with without_pinning():
+            return self._update(change)
+
+    def _update(self, change):
+        # Optimistic concurrency: re-read and retry if another process got in first.
+        for _ in range(self.max_attempts):
+            row, _ = RateLimitState.objects.get_or_create(name=self.name)
+            new_state, result = change({
+                'next_free': row.next_free, 'blocked_until': row.blocked_until, 'failures': row.failures,
+            })
+            if new_state is None:
+                return result
+            updated = RateLimitState.objects.filter(pk=row.pk, version=row.version).update(
+                version=row.version + 1, **new_state,
+            )
+            if updated:
+                return result
+        raise RuntimeError(f"Could not update rate limit state {self.name!r}: too much contention")
+
+
+class UpstreamGovernor:
+    """
+    Token bucket, implemented as virtual scheduling: ``next_free`` is when the
+    bucket would be full again at the steady rate, and a call may start up to
+    ``burst - 1`` intervals ahead of it.
+    """
+
+    def __init__(self, state, rate, burst=1, max_wait=5.0, backoff_base=2.0, backoff_max=300.0, clock=time.time):
+        self.state = state
+        self.interval = 1.0 / rate
+        self.burst = max(1, burst)
+        self.max_wait = max_wait
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.clock = clock
+        self._stats_lock = threading.Lock()
+        self._stats = {'acquired': 0, 'rejected': 0, 'backoffs': 0, 'wait_total': 0.0, 'wait_max': 0.0}
+        self._recent_waits = deque(maxlen=1000)
+
+    def reserve(self):
+        """Claim the next slot and return how many seconds until it starts. Raises UpstreamBusy."""
+        now = self.clock()
+
+        def change(state):
+            start = max(now, state['blocked_until'], state['next_free'] - (self.burst - 1) * self.interval)
+            wait = start - now
+            if wait > self.max_wait:
+                return None, (False, wait)
+            return dict(state, next_free=max(state['next_free'], start) + self.interval), (True, wait)
+
+        granted, wait = self.state.update(change)
+        self._record(granted, wait)
+        if not granted:
+            raise UpstreamBusy(wait)
+        return wait
+
+    def report_success(self):
+        self.state.update(lambda state: (dict(state, failures=0) if state['failures'] else None, None))
+
+    def report_failure(self):
+        """Block all calls for an exponentially growing delay after consecutive upstream errors."""
+        now = self.clock()
+
+        def change(state):
+            failures = state['failures'] + 1
+            delay = min(self.backoff_max, self.backoff_base * 2 ** (failures - 1))
+            return dict(state, failures=failures, blocked_until=max(state['blocked_until'], now + delay)), delay
+
+        delay = self.state.update(change)
+        with self._stats_lock:
+            self._stats['backoffs'] += 1
+        logger.warning("Upstream search failed; backing off for %.1fs", delay)
+
+    def call(self, func, *args, **kwargs):
+        """Wait for a slot, then call ``func``; its exceptions count as upstream errors."""
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            self.report_failure()
+            raise
+        self.report_success()
+        return result
+
+    async def acall(self, func, *args, **kwargs):
+        """call() for a coroutine function; the shared state is updated off the event loop."""
+        def run_sync(method):
+            return sync_to_async(method)() if self.state.shared else asyncio.sleep(0, method())
+
+        wait = await run_sync(self.reserve)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        try:
+            result = await func(*args, **kwargs)
+        except Exception:
+            await run_sync(self.report_failure)
+            raise
+        await run_sync(self.report_success)
+        return result
+
+    def _record(self, granted, wait):
+        with self._stats_lock:
+            if not granted:
+                self._stats['rejected'] += 1
+                return
+            self._stats['acquired'] += 1
+            self._stats['wait_total'] += wait
+            self._stats['wait_max'] = max(self._stats['wait_max'], wait)
+            self._recent_waits.append(wait)
+
+    def stats(self):
+        """Queue-wait metrics for this process (the bucket itself may be shared)."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+            waits = sorted(self._recent_waits)
+
+        def percentile(p):
+            return round(waits[min(len(waits) - 1, int(len(waits) * p))], 3) if waits else None
+
+        return {
+            'backend': 'shared' if self.state.shared else 'local',
+            'pid': os.getpid(),
+            'rate': round(1.0 / self.interval, 3),
+            'burst': self.burst,
+            'acquired': stats['acquired'],
+            'rejected': stats['rejected'],
+            'backoffs': stats['backoffs'],
+            'wait_avg': round(stats['wait_total'] / stats['acquired'], 3) if stats['acquired'] else None,
+            'wait_max': round(stats['wait_max'], 3),
+            'wait_p50': percentile(0.50),
+            'wait_p95': percentile(0.95),
+        }
+
+
+@functools.lru_cache(maxsize=None)
+def get_search_governor():
+    """Return the process-wide governor for upstream searches, configured by the SEARCH_RATE* settings."""
+    if settings.SEARCH_RATE_BACKEND == 'local':
+        state = LocalRateState()
+    else:
+        state = DatabaseRateState('search')
+    return UpstreamGovernor(
+        state,
+        rate=settings.SEARCH_RATE,
+        burst=settings.SEARCH_RATE_BURST,
+        max_wait=settings.SEARCH_RATE_MAX_WAIT,
+        backoff_base=settings.SEARCH_BACKOFF_BASE,
+        backoff_max=settings.SEARCH_BACKOFF_MAX,
+    )
+
+
+@receiver(setting_changed)
+def _reset_search_governor(setting, **kwargs):
+    if setting.startswith(('SEARCH_RATE', 'SEARCH_BACKOFF')):
+        get_search_governor.cache_clear()
@@ -0,0 +1,147 @@
+"""
+Single-flight coalescing of identical searches.
+
+When many users submit the same query at once, only the first one runs the
+upstream search (and fetches the titles for the page it shows); the others wait
+for its result instead of repeating the work. Requests are matched on the result
+set key, i.e. the normalized query plus language.
+
+Within a process, duplicates wait on the running call directly. Across worker
+processes they meet in SEARCH_RESULTS_CACHE: with the tiered cache (the default)
+the first takes its lock for the result set (TieredCache.get_or_compute) and the
+others wait for the stored set. A duplicate that has waited SEARCH_COALESCE_WAIT
+seconds, or whose leader gave up, runs the search itself.
+"""
+import asyncio
+import threading
+
+from django.conf import settings
+
+from .search_results import aload_or_compute_result_set, asave_result_set, load_or_compute_result_set, save_result_set
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Run a function at most once per key at a time; concurrent callers with the same key share its result."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._tasks = {}  # (loop, key) -> task, for do_async()
+
+    def do(self, key, func, timeout=None):
+        """
+        Return ``(func(), shared)``; ``shared`` is True if the result came from another
+        caller's call. A caller that waits longer than ``timeout`` calls ``func`` itself.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            if not call.done.wait(timeout):
+                return func(), False
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+        try:
+            call.result = func()
+            return call.result, False
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def do_async(self, key, func, timeout=None):
+        """do() for a coroutine function. The call runs as a task, so it finishes for the waiting callers even if its own caller goes away."""
+        task_key = (asyncio.get_running_loop(), key)
+        task = self._tasks.get(task_key)
+        leader = task is None
+        if leader:
+            task = self._tasks[task_key] = asyncio.ensure_future(func())
+            task.add_done_callback(lambda _: self._tasks.pop(task_key, None))
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), None if leader else timeout), not leader
+        except asyncio.TimeoutError:
+            return await func(), False
+
+
+_flight = SingleFlight()
+
+
+class SearchFailed(Exception):
+    """Raised inside a result set computation so that a failed search isn't stored."""
+
+    def __init__(self, results, error_message):
+        super().__init__(error_message)
+        self.results = results
+        self.error_message = error_message
+
+
+def _result_set(query, outcome):
+    results, error_message = outcome
+    if error_message is not None:
+        raise SearchFailed(results, error_message)
+    return {'query': query, 'results': results}
+
+
+def coalesce(key, query, search):
+    """
+    Return ``search()``, a ``(results, error_message)`` pair for ``query`` whose result
+    set key is ``key``, unless an identical search is already running here or in
+    another worker, in which case its results are returned instead. Successful
+    results are stored as the result set.
+    """
+    if not settings.SEARCH_COALESCE:
+        results, error_message = search()
+        if error_message is None:
+            save_result_set(key, query, results)
+        return results, error_message
+    (results, error_message), shared = _flight.do(key, lambda: _across_workers(key, query, search), settings.SEARCH_COALESCE_WAIT)
+    if shared and results:
+        results = [dict(item) for item in results] # Each request resolves its own page's titles
+    return results, error_message
+
+
+def _across_workers(key, query, search):
+    try:
+        result_set = load_or_compute_result_set(key, lambda: _result_set(query, search()), settings.SEARCH_COALESCE_WAIT)
+    except SearchFailed as e:
+        return e.results, e.error_message
+    return result_set['results'], None
+
+
+async def acoalesce(key, query, search):
+    """coalesce() for the async search path; ``search`` is a coroutine function."""
+    if not settings.SEARCH_COALESCE:
+        results, error_message = await search()
+        if error_message is None:
+            await asave_result_set(key, query, results)
+        return results, error_message
+    (results, error_message), shared = await _flight.do_async(
+        key, lambda: _across_workers_async(key, query, search), settings.SEARCH_COALESCE_WAIT,
+    )
+    if shared and results:
+        results = [dict(item) for item in results]
+    return results, error_message
+
+
+async def _across_workers_async(key, query, search):
+    async def compute():
+        return _result_set(query, await search())
+
+    try:
+        result_set = await aload_or_compute_result_set(key, compute, settings.SEARCH_COALESCE_WAIT)
+    except SearchFailed as e:
+        return e.results, e.error_message
+    return result_set['results'], None
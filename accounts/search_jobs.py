@@ -0,0 +1,171 @@
+"""
+Database-backed queue of background web searches (SEARCH_BACKGROUND).
+
+search_view stores a SearchJob and returns at once; ``manage.py run_search_workers``
+processes claim jobs, run the upstream search and resolve every title, writing the
+results to the job row as they come in. The search page polls search_job_status
+until the job is finished, then shows the stored result set.
+"""
+import logging
+import os
+import socket
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import SearchJob
+from .rate_governor import UpstreamBusy
+from .search_results import result_set_key, save_result_set
+from .titles import fetch_titles
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue(user, query, lang='en'):
+    return SearchJob.objects.create(user=user, query=query, lang=lang)
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def claim_next(worker):
+    """Take the oldest queued job for ``worker``. Returns None if the queue is empty."""
+    candidates = (SearchJob.objects.filter(status=SearchJob.QUEUED)
+                  .filter(Q(not_before__isnull=True) | Q(not_before__lte=timezone.now()))
+                  .order_by('created_at').values_list('pk', flat=True)[:10])
+    for job_id in candidates:
+        # The conditional UPDATE succeeds for exactly one worker, so no row
+        # locks (SELECT ... FOR UPDATE isn't available on SQLite) are needed.
+        claimed = SearchJob.objects.filter(pk=job_id, status=SearchJob.QUEUED).update(
+            status=SearchJob.RUNNING, worker=worker, attempts=F('attempts') + 1, updated_at=timezone.now(),
+        )
+        if claimed:
+            return SearchJob.objects.get(pk=job_id)
+    return None
+
+
+def _save_progress(job):
+    # Also the heartbeat: a running job whose row stops changing is considered abandoned.
+    SearchJob.objects.filter(pk=job.pk).update(results=job.results, updated_at=timezone.now())
+
+
+def _finish(job, status, error_message=''):
+    now = timezone.now()
+    SearchJob.objects.filter(pk=job.pk).update(
+        status=status, results=job.results, error_message=error_message, updated_at=now, finished_at=now,
+    )
+    job.status, job.error_message, job.finished_at = status, error_message, now
+
+
+def _requeue(job, delay):
+    """Put ``job`` back in the queue for ``delay`` seconds without counting the attempt."""
+    now = timezone.now()
+    SearchJob.objects.filter(pk=job.pk).update(
+        status=SearchJob.QUEUED, worker='', attempts=F('attempts') - 1,
+        not_before=now + timedelta(seconds=delay), updated_at=now,
+    )
+    job.status = SearchJob.QUEUED
+
+
+def run_job(job):
+    """
+    Search for ``job.query`` and resolve every result's title, saving the results
+    to the job at most every SEARCH_JOB_FLUSH_INTERVAL seconds while titles arrive.
+    The finished result set is also stored for the normal paginated search page.
+    If the rate governor has no slot within SEARCH_RATE_MAX_WAIT, the job is
+    requeued until there is one: unlike a browser, nobody here gives up waiting.
+    """
+    from .views import _search_error, _search_results, get_title_from_url
+
+    try:
+        results = _search_results(job.query)
+    except UpstreamBusy as e:
+        _requeue(job, e.retry_after)
+        return job
+    except Exception as e:
+        _finish(job, SearchJob.FAILED, _search_error(e))
+        return job
+
+    job.results = results
+    _save_progress(job)
+    last_flush = time.monotonic()
+
+    def on_result(index, title):
+        nonlocal last_flush
+        results[index]['title'] = title
+        if time.monotonic() - last_flush >= settings.SEARCH_JOB_FLUSH_INTERVAL:
+            _save_progress(job)
+            last_flush = time.monotonic()
+
+    fetch_titles(
+        [item['url'] for item in results],
+        get_title_from_url,
+        deadline=settings.SEARCH_JOB_TITLE_DEADLINE,
+        max_workers=settings.SEARCH_TITLE_WORKERS,
+        per_host_limit=settings.SEARCH_TITLE_PER_HOST,
+        on_result=on_result,
+    )
+    save_result_set(result_set_key(job.query, job.lang), job.query, results)
+    _finish(job, SearchJob.DONE)
+    return job
+
+
+def recover_stale_jobs():
+    """
+    Requeue running jobs whose worker has stopped updating them (it crashed or was
+    killed), or fail them once they have used up SEARCH_JOB_MAX_ATTEMPTS.
+    """
+    now = timezone.now()
+    stale = SearchJob.objects.filter(
+        status=SearchJob.RUNNING, updated_at__lt=now - timedelta(seconds=settings.SEARCH_JOB_STALE_AFTER),
+    )
+    failed = stale.filter(attempts__gte=settings.SEARCH_JOB_MAX_ATTEMPTS).update(
+        status=SearchJob.FAILED, error_message="The search could not be completed. Please try again.",
+        updated_at=now, finished_at=now,
+    )
+    requeued = stale.update(status=SearchJob.QUEUED, worker='', updated_at=now)
+    if failed or requeued:
+        logger.warning("Recovered stale search jobs: %d requeued, %d failed", requeued, failed)
+    return requeued, failed
+
+
+def prune_finished_jobs():
+    """Delete finished jobs older than SEARCH_JOB_RETENTION seconds."""
+    cutoff = timezone.now() - timedelta(seconds=settings.SEARCH_JOB_RETENTION)
+    deleted, _ = SearchJob.objects.filter(
+        status__in=[SearchJob.DONE, SearchJob.FAILED], finished_at__lt=cutoff,
+    ).delete()
+    return deleted
+
+
+def work(stop, poll_interval=1.0, burst=False):
+    """
+    Worker loop: run queued jobs one at a time until ``stop`` (an Event) is set,
+    or, with ``burst``, until the queue is empty. Returns the number of jobs run.
+    """
+    worker = worker_name()
+    processed = 0
+    next_housekeeping = 0.0
+    while not stop.is_set():
+        if time.monotonic() >= next_housekeeping:
+            recover_stale_jobs()
+            prune_finished_jobs()
+            next_housekeeping = time.monotonic() + settings.SEARCH_JOB_STALE_AFTER / 2
+
+        job = claim_next(worker)
+        if job is None:
+            if burst:
+                break
+            stop.wait(poll_interval)
+            continue
+        try:
+            run_job(job)
+        except Exception:
+            logger.exception("Search job %s failed", job.pk)
+            _finish(job, SearchJob.FAILED, "An error occurred during the search. Please try again later.")
+        processed += 1
+    return processed
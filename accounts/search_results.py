@@ -0,0 +1,96 @@
+"""
+Server-side storage for processed search result sets.
+
+A search is run once per query; the resulting ``[{'url': ..., 'title': ...}]`` list
+is kept in the cache under a short key derived from the query, and pagination just
+slices the stored list. Only the key travels in the session or URL.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+
+from .tiered_cache import TieredCache
+
+KEY_PREFIX = 'search:rs:'
+
+
+def normalize_query(query):
+    """Collapse whitespace and case so trivially different spellings share results."""
+    return ' '.join(query.split()).casefold()
+
+
+def result_set_key(query, lang='en'):
+    digest = hashlib.sha1(f'{lang}:{normalize_query(query)}'.encode('utf-8')).hexdigest()
+    return digest[:16]
+
+
+def _cache():
+    return caches[settings.SEARCH_RESULTS_CACHE]
+
+
+def save_result_set(key, query, results):
+    _cache().set(KEY_PREFIX + key, {'query': query, 'results': results}, settings.SEARCH_RESULTS_TTL)
+
+
+def load_result_set(key):
+    """Return ``{'query': ..., 'results': [...]}`` for ``key``, or None if it expired or never existed."""
+    if not key or not key.isalnum():
+        return None
+    return _cache().get(KEY_PREFIX + key)
+
+
+def load_or_compute_result_set(key, compute, wait):
+    """
+    Return the result set stored under ``key``, or store and return ``compute()``.
+    With the tiered cache, a caller that finds another worker computing the same set
+    waits up to ``wait`` seconds for it (TieredCache.get_or_compute); with any other
+    cache every caller computes its own.
+    """
+    cache = _cache()
+    if isinstance(cache, TieredCache):
+        return cache.get_or_compute(KEY_PREFIX + key, compute, settings.SEARCH_RESULTS_TTL, lock_timeout=wait)
+    result_set = load_result_set(key)
+    if result_set is None:
+        result_set = compute()
+        save_result_set(key, result_set['query'], result_set['results'])
+    return result_set
+
+
+# Async variants for the ASGI search view. Django's async cache API runs the sync
+# backend in a worker thread; an in-process cache has no I/O to wait on, so it is
+# called directly and the event loop never hops threads for it.
+
+def _in_process(cache):
+    return isinstance(cache, LocMemCache)
+
+
+async def asave_result_set(key, query, results):
+    cache = _cache()
+    value = {'query': query, 'results': results}
+    if _in_process(cache):
+        cache.set(KEY_PREFIX + key, value, settings.SEARCH_RESULTS_TTL)
+    else:
+        await cache.aset(KEY_PREFIX + key, value, settings.SEARCH_RESULTS_TTL)
+
+
+async def aload_result_set(key):
+    if not key or not key.isalnum():
+        return None
+    cache = _cache()
+    if _in_process(cache):
+        return cache.get(KEY_PREFIX + key)
+    return await cache.aget(KEY_PREFIX + key)
+
+
+async def aload_or_compute_result_set(key, compute, wait):
+    """load_or_compute_result_set() for a coroutine function ``compute``."""
+    cache = _cache()
+    if isinstance(cache, TieredCache):
+        return await cache.aget_or_compute(KEY_PREFIX + key, compute, settings.SEARCH_RESULTS_TTL, lock_timeout=wait)
+    result_set = await aload_result_set(key)
+    if result_set is None:
+        result_set = await compute()
+        await asave_result_set(key, result_set['query'], result_set['results'])
+    return result_set
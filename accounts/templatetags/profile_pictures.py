@@ -0,0 +1,48 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from ..profile_pictures import VARIANT_FORMATS
+
+register = template.Library()
+
+
+@register.simple_tag
+def profile_picture(profile, size, alt='', css_class=''):
+    """
+    Render ``profile``'s picture for a ``size`` pixel square slot::
+
+        {% profile_picture user.profile 40 alt="..." css_class="rounded-circle" %}
+
+    Once the picture's variants exist this is a <picture> offering each size in
+    WebP with a JPEG fallback, so browsers download the smallest file that fills
+    the slot at their pixel density. Until then it is the uploaded file itself,
+    and an empty string if there is no picture.
+    """
+    field = profile.profile_picture if profile is not None else None
+    if not field:
+        return ''
+    storage = field.storage
+    variants = profile.picture_variants or {}
+    if variants.get('source') != field.name:
+        return format_html(
+            '<img src="{}" alt="{}" class="{}" width="{}" height="{}" style="object-fit: cover;">',
+            field.url, alt, css_class, size, size,
+        )
+
+    def srcset(key):
+        by_size = sorted((int(width), name) for width, name in variants[key].items())
+        return format_html_join(', ', '{} {}w', ((storage.url(name), width) for width, name in by_size))
+
+    sources = format_html_join(
+        '', '<source type="{}" srcset="{}" sizes="{}px">',
+        ((mime, srcset(key), size) for key, _, _, mime in VARIANT_FORMATS[:-1]),
+    )
+    fallback_key = VARIANT_FORMATS[-1][0]
+    widths = sorted(int(width) for width in variants[fallback_key])
+    src_width = next((width for width in widths if width >= int(size)), widths[-1])
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" sizes="{}px" alt="{}" class="{}" width="{}" height="{}"'
+        ' style="object-fit: cover;"></picture>',
+        sources, storage.url(variants[fallback_key][str(src_width)]), srcset(fallback_key), size,
+        alt, css_class, size, size,
+    )
@@ -0,0 +1,496 @@
+"""
+The app's cache: CACHES['default'] is a TieredCache, and everything that caches
+(search result sets, page titles and the locks for computing them) goes through it.
+
+* Tier 1 is a small LRU in each worker process, holding pickled copies of recently
+  used entries for at most LOCAL_TIMEOUT seconds (so a change made by another
+  worker shows up here within that time).
+* Tier 2 is a cache shared by all workers: SQLiteCache below (a local file, no
+  server needed) by default, or Redis via Django's RedisCache.
+
+get_or_compute() (and aget_or_compute()) adds stampede protection on top: of the
+callers that miss the same key at once, in any worker, one takes a short lock in
+the shared tier and computes the value while the others wait for it. Search
+result sets (search_flight) go through it, and title fetches
+(titles.SharedTitleStore) through the lock alone, compute_once().
+
+Hit/miss counters are kept per namespace (the key up to its first ':', e.g.
+"search" or "title") and added to counters in the shared tier every
+STATS_INTERVAL seconds; ``manage.py cache_stats`` prints them.
+"""
+import asyncio
+import atexit
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+MISSING = object()
+STATS_PREFIX = 'cache-stats:'
+# The namespaces seen so far: each is claimed once with add() and then given the next
+# slot from an incr() counter, so processes registering at once can't lose one.
+STATS_REGISTRY_PREFIX = 'cache-stats-registry:'
+STATS_REGISTRY_COUNT_KEY = STATS_REGISTRY_PREFIX + 'count'
+STATS_METRICS = ('local_hits', 'shared_hits', 'misses', 'sets', 'lock_waits')
+LOCK_PREFIX = 'lock:'
+LOCK_POLL_INTERVAL = 0.05
+
+
+class SQLiteCache(BaseCache):
+    """
+    Cache in a SQLite file (LOCATION), shared by every process on the host. Each
+    thread keeps its own connection; the file runs in WAL mode so readers never
+    wait for a writer. ``add`` and ``incr`` are atomic, so the cache can hold locks.
+    """
+    CULL_EVERY = 100 # Sets between checks of the entry count
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.path = location
+        self._local = threading.local()
+
+    def _connection(self):
+        # Per thread and per process: a connection must not be used after a fork.
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)'
+                         ' WITHOUT ROWID')
+            conn.execute('CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)')
+            self._local.conn, self._local.pid, self._local.sets = conn, os.getpid(), 0
+        return conn
+
+    def _expires(self, timeout):
+        return self.get_backend_timeout(timeout)
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self._connection().execute(
+            'SELECT value FROM cache WHERE key = ? AND (expires IS NULL OR expires > ?)', (key, time.time()),
+        ).fetchone()
+        return default if row is None else pickle.loads(row[0])
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        conn = self._connection()
+        if timeout == 0:
+            conn.execute('DELETE FROM cache WHERE key = ?', (key,))
+            return
+        conn.execute('INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)',
+                     (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), self._expires(timeout)))
+        self._local.sets += 1
+        if self._local.sets % self.CULL_EVERY == 0:
+            self._cull(conn)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+        # Insert, or take over an expired entry; a live entry is left alone.
+        cursor = self._connection().execute(
+            'INSERT INTO cache (key, value, expires) VALUES (?, ?, ?) ON CONFLICT (key) DO UPDATE'
+            ' SET value = excluded.value, expires = excluded.expires WHERE cache.expires <= ?',
+            (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), self._expires(timeout), now),
+        )
+        return cursor.rowcount > 0
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._connection().execute(
+            'UPDATE cache SET expires = ? WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (self._expires(timeout), key, time.time()),
+        )
+        return cursor.rowcount > 0
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._connection().execute('DELETE FROM cache WHERE key = ?', (key,)).rowcount > 0
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._connection().execute(
+            'SELECT 1 FROM cache WHERE key = ? AND (expires IS NULL OR expires > ?)', (key, time.time()),
+        ).fetchone() is not None
+
+    def incr(self, key, delta=1, version=None):
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            value = self.get(key, MISSING, version=version)
+            if value is MISSING:
+                raise ValueError("Key '%s' not found" % key)
+            value += delta
+            full_key = self.make_and_validate_key(key, version=version)
+            conn.execute('UPDATE cache SET value = ? WHERE key = ?', (pickle.dumps(value, pickle.HIGHEST_PROTOCOL), full_key))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return value
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache')
+
+    def _cull(self, conn):
+        conn.execute('DELETE FROM cache WHERE expires <= ?', (time.time(),))
+        count = conn.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count > self._max_entries:
+            # Drop the entries closest to expiring (those that never expire last).
+            conn.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY expires IS NULL, expires LIMIT ?)',
+                (max(count - self._max_entries, count // self._cull_frequency if self._cull_frequency else count),),
+            )
+
+
+class _Entry:
+    """What TieredCache stores: the value and when it expires."""
+    __slots__ = ('value', 'expires')
+
+    def __init__(self, value, expires):
+        self.value = value
+        self.expires = expires
+
+    def __getstate__(self):
+        return (self.value, self.expires)
+
+    def __setstate__(self, state):
+        # Entries written before the compute cost was dropped carry it as a third item.
+        self.value, self.expires = state[:2]
+
+
+class _LocalTier:
+    """The in-process LRU and stats of one TieredCache, shared by all the threads of a process."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max(1, max_entries)
+        self.data = OrderedDict() # key -> (pickled _Entry, drop_at)
+        self.lock = threading.Lock()
+        self.stats = Counter() # (namespace, metric) -> count not yet flushed
+        self.flushed_at = time.monotonic()
+
+
+_tiers = {}
+_tiers_lock = threading.Lock()
+
+
+def _namespace(key):
+    return key.split(':', 1)[0] if ':' in key else 'default'
+
+
+class TieredCache(BaseCache):
+    """
+    Django cache backend: a per-process LRU in front of the cache alias named by the
+    SHARED_ALIAS option. Options: LOCAL_MAX_ENTRIES, LOCAL_TIMEOUT (seconds an entry
+    is served from process memory), LOCK_TIMEOUT (for compute_once) and
+    STATS_INTERVAL (seconds between stats flushes).
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.shared_alias = options.get('SHARED_ALIAS', 'shared')
+        self.local_timeout = options.get('LOCAL_TIMEOUT', 5)
+        self.lock_timeout = options.get('LOCK_TIMEOUT', 10)
+        self.stats_interval = options.get('STATS_INTERVAL', 10)
+        # Looked up once, so that stats flushed at exit go where this cache's entries went.
+        self.shared = caches[self.shared_alias]
+        with _tiers_lock:
+            tier = _tiers.get(location)
+            if tier is None:
+                tier = _tiers[location] = _LocalTier(options.get('LOCAL_MAX_ENTRIES', 1000))
+                atexit.register(self.flush_stats)
+        self.tier = tier
+
+
+    # Local tier
+
+    def _local_get(self, local_key):
+        with self.tier.lock:
+            item = self.tier.data.get(local_key)
+            if item is None:
+                return None
+            pickled, drop_at = item
+            if drop_at <= time.monotonic():
+                del self.tier.data[local_key]
+                return None
+            self.tier.data.move_to_end(local_key)
+        entry = pickle.loads(pickled)
+        if entry.expires is not None and entry.expires <= time.time():
+            return None
+        return entry
+
+    def _local_set(self, local_key, entry):
+        # Pickled, so that callers mutating what they got can't change the cached value.
+        pickled = pickle.dumps(entry, pickle.HIGHEST_PROTOCOL)
+        with self.tier.lock:
+            self.tier.data[local_key] = (pickled, time.monotonic() + self.local_timeout)
+            self.tier.data.move_to_end(local_key)
+            while len(self.tier.data) > self.tier.max_entries:
+                self.tier.data.popitem(last=False)
+
+    def _local_delete(self, local_key):
+        with self.tier.lock:
+            self.tier.data.pop(local_key, None)
+
+    # Stats
+
+    def _tally(self, key, metric):
+        """Count one ``metric`` for ``key``'s namespace; returns whether a flush is due."""
+        with self.tier.lock:
+            self.tier.stats[_namespace(key), metric] += 1
+            return time.monotonic() - self.tier.flushed_at >= self.stats_interval
+
+    def _count(self, key, metric):
+        if self._tally(key, metric):
+            self.flush_stats()
+
+    async def _acount(self, key, metric):
+        if self._tally(key, metric):
+            await sync_to_async(self.flush_stats, thread_sensitive=False)()
+
+    def flush_stats(self):
+        """Add this process's counters to the shared per-namespace totals."""
+        with self.tier.lock:
+            pending, self.tier.stats = self.tier.stats, Counter()
+            self.tier.flushed_at = time.monotonic()
+        if not pending:
+            return
+        try:
+            shared = self.shared
+            for namespace in {namespace for namespace, _ in pending}:
+                _register_namespace(shared, namespace)
+            for (namespace, metric), count in pending.items():
+                key = f'{STATS_PREFIX}{namespace}:{metric}'
+                shared.add(key, 0, None)
+                shared.incr(key, count)
+        except Exception:
+            # Stats are best effort; put the counts back for the next flush.
+            with self.tier.lock:
+                self.tier.stats.update(pending)
+
+    # Cache API
+
+    def _timeout(self, timeout):
+        return self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+
+    def _get_entry(self, key, version, count=True):
+        local_key = self.make_and_validate_key(key, version=version)
+        entry = self._local_get(local_key)
+        if entry is not None:
+            if count:
+                self._count(key, 'local_hits')
+            return entry
+        entry = self.shared.get(key, version=version)
+        if not isinstance(entry, _Entry) or (entry.expires is not None and entry.expires <= time.time()):
+            if count:
+                self._count(key, 'misses')
+            return None
+        if count:
+            self._count(key, 'shared_hits')
+        self._local_set(local_key, entry)
+        return entry
+
+    def _set_entry(self, key, value, timeout, version):
+        timeout = self._timeout(timeout)
+        local_key = self.make_and_validate_key(key, version=version)
+        if timeout is not None and timeout <= 0:
+            self.delete(key, version=version)
+            return None
+        entry = _Entry(value, None if timeout is None else time.time() + timeout)
+        self.shared.set(key, entry, timeout, version=version)
+        self._local_set(local_key, entry)
+        self._count(key, 'sets')
+        return entry
+
+    def get(self, key, default=None, version=None):
+        entry = self._get_entry(key, version)
+        return default if entry is None else entry.value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._set_entry(key, value, timeout, version)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self._timeout(timeout)
+        entry = _Entry(value, None if timeout is None else time.time() + timeout)
+        added = self.shared.add(key, entry, timeout, version=version)
+        if added:
+            self._local_set(self.make_and_validate_key(key, version=version), entry)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        entry = self._get_entry(key, version, count=False)
+        if entry is None:
+            return False
+        self._set_entry(key, entry.value, timeout, version)
+        return True
+
+    def incr(self, key, delta=1, version=None):
+        # Keeps the entry's expiry; not atomic, so don't count with it across workers.
+        entry = self._get_entry(key, version, count=False)
+        if entry is None:
+            raise ValueError("Key '%s' not found" % key)
+        timeout = None if entry.expires is None else max(entry.expires - time.time(), 0.001)
+        self._set_entry(key, entry.value + delta, timeout, version)
+        return entry.value + delta
+
+    def delete(self, key, version=None):
+        self._local_delete(self.make_and_validate_key(key, version=version))
+        return self.shared.delete(key, version=version)
+
+    def has_key(self, key, version=None):
+        return self._get_entry(key, version, count=False) is not None
+
+    def clear(self):
+        with self.tier.lock:
+            self.tier.data.clear()
+        self.shared.clear()
+
+    # Async API: local hits are answered on the event loop; anything that reaches the
+    # shared tier (a SQLite file or a Redis socket) runs in a worker thread.
+
+    async def aget(self, key, default=None, version=None):
+        entry = self._local_get(self.make_and_validate_key(key, version=version))
+        if entry is not None:
+            await self._acount(key, 'local_hits')
+            return entry.value
+        return await sync_to_async(self.get, thread_sensitive=False)(key, default, version)
+
+    async def aset(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        await sync_to_async(self.set, thread_sensitive=False)(key, value, timeout, version)
+
+    async def aadd(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return await sync_to_async(self.add, thread_sensitive=False)(key, value, timeout, version)
+
+    async def adelete(self, key, version=None):
+        return await sync_to_async(self.delete, thread_sensitive=False)(key, version)
+
+    def compute_once(self, key, compute, poll=None, version=None, lock_timeout=None):
+        """
+        Call ``compute()``, which stores the value under ``key`` itself, in just one
+        of the callers missing ``key`` at once. The others poll ``key`` for up to
+        ``lock_timeout`` seconds (LOCK_TIMEOUT) and return ``poll(value)`` for the
+        first value found for which it isn't MISSING (the value itself by default);
+        if none turns up, or the holder gives up, they compute it themselves.
+        """
+        poll = poll or (lambda value: value)
+        lock_timeout = self.lock_timeout if lock_timeout is None else lock_timeout
+        lock_key = LOCK_PREFIX + key
+        locked = self.shared.add(lock_key, True, lock_timeout, version=version)
+        if not locked:
+            self._count(key, 'lock_waits')
+            deadline = time.monotonic() + lock_timeout
+            while time.monotonic() < deadline:
+                time.sleep(LOCK_POLL_INTERVAL)
+                entry = self._get_entry(key, version, count=False)
+                value = MISSING if entry is None else poll(entry.value)
+                if value is not MISSING:
+                    return value
+                if self.shared.add(lock_key, True, lock_timeout, version=version):
+                    locked = True # The holder gave up without storing a value
+                    break
+        try:
+            return compute()
+        finally:
+            if locked:
+                self.shared.delete(lock_key, version=version)
+
+    async def acompute_once(self, key, compute, poll=None, version=None, lock_timeout=None):
+        """compute_once() for a coroutine function ``compute``; waiting doesn't hold a thread."""
+        poll = poll or (lambda value: value)
+        lock_timeout = self.lock_timeout if lock_timeout is None else lock_timeout
+        lock_key = LOCK_PREFIX + key
+        take_lock = sync_to_async(self.shared.add, thread_sensitive=False)
+        locked = await take_lock(lock_key, True, lock_timeout, version=version)
+        if not locked:
+            await self._acount(key, 'lock_waits')
+            get_entry = sync_to_async(self._get_entry, thread_sensitive=False)
+            deadline = time.monotonic() + lock_timeout
+            while time.monotonic() < deadline:
+                await asyncio.sleep(LOCK_POLL_INTERVAL)
+                entry = await get_entry(key, version, count=False)
+                value = MISSING if entry is None else poll(entry.value)
+                if value is not MISSING:
+                    return value
+                if await take_lock(lock_key, True, lock_timeout, version=version):
+                    locked = True
+                    break
+        try:
+            return await compute()
+        finally:
+            if locked:
+                await sync_to_async(self.shared.delete, thread_sensitive=False)(lock_key, version=version)
+
+    def get_or_compute(self, key, compute, timeout=DEFAULT_TIMEOUT, version=None, lock_timeout=None):
+        """
+        Return the cached value for ``key``, or store and return ``compute()``. Of
+        the callers missing ``key`` at once, one computes (compute_once) while the
+        others wait for its value. If ``compute`` raises, nothing is stored.
+        """
+        entry = self._get_entry(key, version)
+        if entry is not None:
+            return entry.value
+
+        def compute_and_store():
+            value = compute()
+            self._set_entry(key, value, timeout, version)
+            return value
+        return self.compute_once(key, compute_and_store, version=version, lock_timeout=lock_timeout)
+
+    async def aget_or_compute(self, key, compute, timeout=DEFAULT_TIMEOUT, version=None, lock_timeout=None):
+        """get_or_compute() for a coroutine function ``compute``."""
+        value = await self.aget(key, MISSING, version)
+        if value is not MISSING:
+            return value
+
+        async def compute_and_store():
+            value = await compute()
+            await sync_to_async(self._set_entry, thread_sensitive=False)(key, value, timeout, version)
+            return value
+        return await self.acompute_once(key, compute_and_store, version=version, lock_timeout=lock_timeout)
+
+def _register_namespace(shared, namespace):
+    if shared.add(f'{STATS_REGISTRY_PREFIX}name:{namespace}', True, None):
+        shared.add(STATS_REGISTRY_COUNT_KEY, 0, None)
+        slot = shared.incr(STATS_REGISTRY_COUNT_KEY)
+        shared.set(f'{STATS_REGISTRY_PREFIX}slot:{slot}', namespace, None)
+
+
+def _registry_keys(shared):
+    return [f'{STATS_REGISTRY_PREFIX}slot:{slot}' for slot in range(1, (shared.get(STATS_REGISTRY_COUNT_KEY) or 0) + 1)]
+
+
+def _namespaces(shared):
+    return sorted(set(shared.get_many(_registry_keys(shared)).values()))
+
+
+def read_stats(cache):
+    """Return ``{namespace: {metric: count, ..., 'hit_rate': ...}}`` from the shared totals of TieredCache ``cache``."""
+    cache.flush_stats()
+    shared = cache.shared
+    stats = {}
+    for namespace in _namespaces(shared):
+        counts = shared.get_many([f'{STATS_PREFIX}{namespace}:{metric}' for metric in STATS_METRICS])
+        row = {metric: counts.get(f'{STATS_PREFIX}{namespace}:{metric}', 0) for metric in STATS_METRICS}
+        hits = row['local_hits'] + row['shared_hits']
+        lookups = hits + row['misses']
+        row['hit_rate'] = round(hits / lookups, 4) if lookups else None
+        row['local_hit_rate'] = round(row['local_hits'] / lookups, 4) if lookups else None
+        stats[namespace] = row
+    return stats
+
+
+def reset_stats(cache):
+    shared = cache.shared
+    namespaces = _namespaces(shared)
+    shared.delete_many([f'{STATS_PREFIX}{namespace}:{metric}' for namespace in namespaces for metric in STATS_METRICS])
+    shared.delete_many([f'{STATS_REGISTRY_PREFIX}name:{namespace}' for namespace in namespaces] + _registry_keys(shared))
+    shared.delete(STATS_REGISTRY_COUNT_KEY)
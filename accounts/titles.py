@@ -0,0 +1,506 @@
+"""
+Helpers for resolving page titles of web search results.
+"""
+import asyncio
+import functools
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict, deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from .tiered_cache import MISSING, TieredCache
+
+logger = logging.getLogger(__name__)
+
+# Placeholder titles shown in the search results. The template compares against
+# these strings, so keep them in sync with templates/search.html.
+FETCH_ERROR_TITLE = "Could not fetch title"
+PARSE_ERROR_TITLE = "Error parsing title"
+PENDING_TITLE = "Title pending"
+
+
+def _host(url):
+    try:
+        return urlsplit(url).hostname or ''
+    except ValueError:
+        return ''
+
+
+@functools.lru_cache(maxsize=None)
+def get_title_executor():
+    """
+    Return the process-wide pool of SEARCH_TITLE_POOL_SIZE threads that every
+    iter_titles() call fetches on, so fetches left running past a deadline can't
+    add threads without limit.
+    """
+    return ThreadPoolExecutor(max_workers=max(1, settings.SEARCH_TITLE_POOL_SIZE), thread_name_prefix='title-fetch')
+
+
+def iter_titles(urls, fetch_title, deadline=None, max_workers=8, per_host_limit=2):
+    """
+    Resolve titles for ``urls`` concurrently with ``fetch_title(url)``, yielding
+    ``(index, title)`` pairs in the order they finish.
+
+    At most ``max_workers`` fetches run at once and at most ``per_host_limit`` of
+    them against the same host, on the shared pool (get_title_executor()). Once
+    ``deadline`` seconds have passed the generator stops: titles not yielded by
+    then are still pending, fetches still waiting for a pool thread are cancelled
+    and any fetch in progress is left to finish in the background. Closing the
+    generator early does the same.
+    """
+    urls = list(urls)
+    if not urls:
+        return
+
+    max_workers = max(1, max_workers)
+    per_host_limit = max(1, per_host_limit)
+    queue = deque(enumerate(urls))
+    in_flight = {}  # future -> (index, host)
+    host_counts = Counter()
+    started = time.monotonic()
+
+    executor = get_title_executor()
+    try:
+        while queue or in_flight:
+            # Start as many fetches as the worker and per-host limits allow,
+            # keeping URLs for busy hosts at the front of the queue.
+            deferred = []
+            while queue and len(in_flight) < max_workers:
+                index, url = queue.popleft()
+                host = _host(url)
+                if host_counts[host] >= per_host_limit:
+                    deferred.append((index, url))
+                    continue
+                host_counts[host] += 1
+                in_flight[executor.submit(fetch_title, url)] = (index, host)
+            queue.extendleft(reversed(deferred))
+
+            timeout = None
+            if deadline is not None:
+                timeout = deadline - (time.monotonic() - started)
+                if timeout <= 0:
+                    break
+            done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                break  # Deadline reached
+
+            for future in done:
+                index, host = in_flight.pop(future)
+                host_counts[host] -= 1
+                try:
+                    title = future.result()
+                except Exception:
+                    logger.exception("Title fetch failed for %s", urls[index])
+                    title = FETCH_ERROR_TITLE
+                yield index, title
+    finally:
+        # Don't block the request on stragglers; they finish (or time out) on their own.
+        for future in in_flight:
+            future.cancel()
+        if in_flight or queue:
+            logger.info("Title deadline reached with %d of %d titles pending", len(in_flight) + len(queue), len(urls))
+
+
+def fetch_titles(urls, fetch_title, deadline=None, max_workers=8, per_host_limit=2, on_result=None):
+    """
+    iter_titles() collected into a list of ``{'url': ..., 'title': ...}`` dicts in
+    the order of ``urls``; titles still unresolved at the deadline are PENDING_TITLE.
+
+    ``on_result(index, title)``, if given, is called in the calling thread as each
+    title arrives, for callers that hand out results before all of them are in.
+    """
+    urls = list(urls)
+    titles = [PENDING_TITLE] * len(urls)
+    for index, title in iter_titles(urls, fetch_title, deadline, max_workers, per_host_limit):
+        titles[index] = title
+        if on_result is not None:
+            on_result(index, title)
+    return [{'url': url, 'title': title} for url, title in zip(urls, titles)]
+
+
+async def aiter_titles(urls, fetch_title, deadline=None, max_concurrency=8, per_host_limit=2):
+    """
+    Async generator version of iter_titles() for the async search path:
+    ``fetch_title`` is a coroutine function and the fetches run as tasks on the
+    current event loop. Fetches still running at the deadline (or when the
+    generator is closed) keep going in the background, so their titles still end
+    up in the title cache.
+    """
+    urls = list(urls)
+    if not urls:
+        return
+
+    overall = asyncio.Semaphore(max(1, max_concurrency))
+    per_host = defaultdict(lambda: asyncio.Semaphore(max(1, per_host_limit)))
+
+    async def fetch_one(url):
+        async with overall, per_host[_host(url)]:
+            return await fetch_title(url)
+
+    tasks = {asyncio.ensure_future(fetch_one(url)): index for index, url in enumerate(urls)}
+    pending = set(tasks)
+    ends_at = None if deadline is None else asyncio.get_running_loop().time() + deadline
+    try:
+        while pending:
+            timeout = None if ends_at is None else ends_at - asyncio.get_running_loop().time()
+            if timeout is not None and timeout <= 0:
+                break
+            done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                break  # Deadline reached
+            for task in done:
+                index = tasks[task]
+                if task.exception() is not None:
+                    logger.error("Title fetch failed for %s", urls[index], exc_info=task.exception())
+                    yield index, FETCH_ERROR_TITLE
+                else:
+                    yield index, task.result()
+    finally:
+        for task in pending:
+            run_in_background(task)
+        if pending:
+            logger.info("Title deadline reached with %d of %d titles pending", len(pending), len(urls))
+
+
+async def fetch_titles_async(urls, fetch_title, deadline=None, max_concurrency=8, per_host_limit=2):
+    """Coroutine version of fetch_titles(), collecting aiter_titles()."""
+    urls = list(urls)
+    titles = [PENDING_TITLE] * len(urls)
+    async for index, title in aiter_titles(urls, fetch_title, deadline, max_concurrency, per_host_limit):
+        titles[index] = title
+    return [{'url': url, 'title': title} for url, title in zip(urls, titles)]
+
+
+_background_tasks = set()
+
+
+def run_in_background(awaitable):
+    """Schedule ``awaitable`` on the running loop without waiting for it (keeping a reference so it isn't garbage collected)."""
+    task = asyncio.ensure_future(awaitable)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+_prefetch_executor = None
+_prefetch_lock = threading.Lock()
+
+
+def prefetch_titles(urls, fetch_title, max_workers=4):
+    """
+    Call ``fetch_title`` for each URL on a shared background pool and return the
+    futures without waiting. Used to warm the title cache for pages the user is
+    likely to open next.
+    """
+    global _prefetch_executor
+    with _prefetch_lock:
+        if _prefetch_executor is None:
+            _prefetch_executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix='title-prefetch')
+    return [_prefetch_executor.submit(fetch_title, url) for url in urls]
+
+
+class TitleFetch(namedtuple('TitleFetch', ['title', 'etag', 'last_modified'], defaults=(None, None))):
+    """
+    What a page fetcher returns: the title plus the response's validators. A
+    ``title`` of None means the server answered 304 Not Modified to a conditional
+    request, i.e. the cached title is still good.
+    """
+    __slots__ = ()
+
+
+class LocMemTitleStore:
+    """
+    In-process LRU store. Each worker process keeps its own copy.
+    """
+    shared = False
+
+    def __init__(self, max_entries):
+        self.max_entries = max(1, max_entries)
+        self._data = OrderedDict()  # key -> (entry, drop_at)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            entry, drop_at = item
+            if drop_at <= time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return entry
+
+    def set(self, key, entry, timeout):
+        """Store ``entry`` and return how many older entries were evicted to make room."""
+        evicted = 0
+        with self._lock:
+            self._data[key] = (entry, time.time() + timeout)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                evicted += 1
+        return evicted
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    # Nothing to wait on in process memory, so the async path calls straight through.
+
+    async def aget(self, key):
+        return self.get(key)
+
+    async def aset(self, key, entry, timeout):
+        return self.set(key, entry, timeout)
+
+    def fetch_once(self, key, fetch, poll):
+        return fetch()
+
+    async def afetch_once(self, key, fetch, poll):
+        return await fetch()
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SharedTitleStore:
+    """
+    Store backed by a Django cache alias (e.g. Redis, memcached or the database
+    cache) so every worker sees the same titles. Size limits and LRU eviction are
+    whatever that cache backend is configured to do, so evictions aren't counted here.
+
+    With the tiered cache, concurrent misses on one URL in any worker share a single
+    fetch: the first takes the cache's lock (TieredCache.compute_once) and the rest
+    wait for the title it stores, as ``poll`` finds it.
+    """
+    shared = True
+
+    def __init__(self, alias):
+        self.cache = caches[alias]
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, entry, timeout):
+        self.cache.set(key, entry, timeout)
+        return 0
+
+    async def aget(self, key):
+        return await self.cache.aget(key)
+
+    async def aset(self, key, entry, timeout):
+        await self.cache.aset(key, entry, timeout)
+        return 0
+
+    def fetch_once(self, key, fetch, poll):
+        if not isinstance(self.cache, TieredCache):
+            return fetch()
+        return self.cache.compute_once(key, fetch, poll)
+
+    async def afetch_once(self, key, fetch, poll):
+        if not isinstance(self.cache, TieredCache):
+            return await fetch()
+        return await self.cache.acompute_once(key, fetch, poll)
+
+    def delete(self, key):
+        self.cache.delete(key)
+
+    def clear(self):
+        # Clears the whole alias, so point TITLE_CACHE_BACKEND at a dedicated cache.
+        self.cache.clear()
+
+    def __len__(self):
+        return 0
+
+
+class TitleCache:
+    """
+    URL -> title cache in front of the page fetcher.
+
+    Successful titles are kept for ``ttl`` seconds and fetch/parse failures for the
+    shorter ``negative_ttl`` so a site that was briefly down gets retried soon.
+    Titles whose page sent an ETag or Last-Modified header are kept for another
+    ``revalidate_window`` seconds after they expire, so they can be refreshed with
+    a conditional request (a cheap 304) instead of a full download.
+    Hit/miss/eviction counters are per process.
+    """
+    key_prefix = 'title:'
+
+    def __init__(self, store, ttl, negative_ttl, revalidate_window=0, clock=time.time):
+        self.store = store
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.revalidate_window = revalidate_window
+        self.clock = clock
+        self._stats = Counter()
+        self._stats_lock = threading.Lock()
+
+    def _key(self, url):
+        # Hash so arbitrary URLs are safe cache keys for every backend (memcached
+        # rejects long keys and whitespace).
+        return self.key_prefix + hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+    def _count(self, name, amount=1):
+        if amount:
+            with self._stats_lock:
+                self._stats[name] += amount
+
+    def _lookup(self, url):
+        """Return ``(fresh_title, stale_entry)``; at most one of them is set."""
+        return self._check(self.store.get(self._key(url)))
+
+    async def _alookup(self, url):
+        return self._check(await self.store.aget(self._key(url)))
+
+    def _check(self, entry):
+        if entry is not None:
+            title, expires, etag, last_modified = entry
+            if expires > self.clock():
+                self._count('hits')
+                if title in (FETCH_ERROR_TITLE, PARSE_ERROR_TITLE):
+                    self._count('negative_hits')
+                return title, None
+            self._count('expired')
+        self._count('misses')
+        return None, entry
+
+    def get(self, url):
+        """Return the cached title for ``url``, or None on a miss."""
+        return self._lookup(url)[0]
+
+    def _fresh_title(self, entry):
+        """For a lookup waiting on another worker's fetch: the title it stored, once it is fresh."""
+        title, expires = entry[:2]
+        return title if expires > self.clock() else MISSING
+
+    def _entry(self, title, etag, last_modified):
+        """Return ``(entry, keep_for)`` to store for ``title``, or None if it isn't cached."""
+        if title == PENDING_TITLE:
+            return None
+        if title in (FETCH_ERROR_TITLE, PARSE_ERROR_TITLE):
+            ttl, etag, last_modified = self.negative_ttl, None, None
+        else:
+            ttl = self.ttl
+        if ttl <= 0:
+            return None
+        keep_for = ttl + (self.revalidate_window if etag or last_modified else 0)
+        return (title, self.clock() + ttl, etag, last_modified), keep_for
+
+    def set(self, url, title, etag=None, last_modified=None):
+        entry = self._entry(title, etag, last_modified)
+        if entry is not None:
+            self._count('evictions', self.store.set(self._key(url), *entry))
+
+    async def aset(self, url, title, etag=None, last_modified=None):
+        entry = self._entry(title, etag, last_modified)
+        if entry is not None:
+            self._count('evictions', await self.store.aset(self._key(url), *entry))
+
+    @staticmethod
+    def _validators(stale):
+        if stale is not None and (stale[2] or stale[3]):
+            return {'etag': stale[2], 'last_modified': stale[3]}
+        return {}
+
+    def _revalidated(self, stale, result):
+        if result.title is None:
+            # 304 Not Modified: keep the title we have, with any updated validators.
+            self._count('revalidated')
+            result = TitleFetch(stale[0], result.etag or stale[2], result.last_modified or stale[3])
+        return result
+
+    def _remember(self, url, stale, result):
+        result = self._revalidated(stale, result)
+        self.set(url, result.title, result.etag, result.last_modified)
+        return result.title
+
+    async def _aremember(self, url, stale, result):
+        result = self._revalidated(stale, result)
+        await self.aset(url, result.title, result.etag, result.last_modified)
+        return result.title
+
+    def get_or_fetch(self, url, fetch_title):
+        """
+        Return the title for ``url``, calling ``fetch_title(url, etag=..., last_modified=...)``
+        (which returns a TitleFetch) on a miss. Expired entries with validators are
+        passed along so the fetcher can make a conditional request.
+        """
+        title, stale = self._lookup(url)
+        if title is not None:
+            return title
+        return self.store.fetch_once(
+            self._key(url), lambda: self._remember(url, stale, fetch_title(url, **self._validators(stale))),
+            self._fresh_title,
+        )
+
+    async def aget_or_fetch(self, url, fetch_title):
+        """
+        get_or_fetch() for a coroutine ``fetch_title``. The store's async methods keep
+        shared-cache I/O off the event loop; titles in process memory (locmem, or the
+        tiered cache's local tier) are answered without leaving it.
+        """
+        title, stale = await self._alookup(url)
+        if title is not None:
+            return title
+
+        async def fetch():
+            return await self._aremember(url, stale, await fetch_title(url, **self._validators(stale)))
+        return await self.store.afetch_once(self._key(url), fetch, self._fresh_title)
+
+    def clear(self):
+        self.store.clear()
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats.get('hits', 0) + stats.get('misses', 0)
+        return {
+            'backend': 'shared' if self.store.shared else 'locmem',
+            'pid': os.getpid(),
+            'hits': stats.get('hits', 0),
+            'negative_hits': stats.get('negative_hits', 0),
+            'misses': stats.get('misses', 0),
+            'expired': stats.get('expired', 0),
+            'revalidated': stats.get('revalidated', 0),
+            'evictions': stats.get('evictions', 0),
+            'hit_rate': round(stats.get('hits', 0) / lookups, 4) if lookups else None,
+            'entries': len(self.store) if not self.store.shared else None,
+            'max_entries': getattr(self.store, 'max_entries', None),
+        }
+
+
+@functools.lru_cache(maxsize=None)
+def get_title_cache():
+    """Return the process-wide title cache configured by the TITLE_CACHE_* settings."""
+    if settings.TITLE_CACHE_BACKEND == 'locmem':
+        store = LocMemTitleStore(settings.TITLE_CACHE_MAX_ENTRIES)
+    else:
+        store = SharedTitleStore(settings.TITLE_CACHE_BACKEND)
+    return TitleCache(
+        store,
+        settings.TITLE_CACHE_TTL,
+        settings.TITLE_CACHE_NEGATIVE_TTL,
+        revalidate_window=settings.TITLE_CACHE_REVALIDATE_WINDOW,
+    )
+
+
+@receiver(setting_changed)
+def _reset_title_cache(setting, **kwargs):
+    if setting.startswith('TITLE_CACHE_') or setting == 'CACHES':
+        get_title_cache.cache_clear()
+    elif setting == 'SEARCH_TITLE_POOL_SIZE':
+        get_title_executor.cache_clear()
@@ -1,4 +1,5 @@
 from django.urls import path, reverse_lazy
+from django.conf import settings
 from . import views
 from django.contrib.auth import views as auth_views
 
@@ -10,7 +11,13 @@ urlpatterns = [
     path('admin_dashboard/', views.admin_dashboard, name='admin_dashboard'),
     path('approve/<int:user_id>/', views.approve_user, name='approve_user'),
     path('reject/<int:user_id>/', views.reject_user, name='reject_user'),
-    path('search/', views.search_view, name='search'),
+    path('admin_dashboard/bulk/', views.bulk_user_action, name='bulk_user_action'),
+    path('search/', views.search_view_async if settings.SEARCH_ASYNC else views.search_view, name='search'),
+    path('search/titles/', views.search_titles, name='search_titles'),
+    path('search/stream/', views.search_stream_async if settings.SEARCH_ASYNC else views.search_stream, name='search_stream'),
+    path('search/jobs/<int:job_id>/', views.search_job_status, name='search_job_status'),
+    path('search/title_cache_stats/', views.title_cache_stats, name='title_cache_stats'),
+    path('search/governor_stats/', views.search_governor_stats, name='search_governor_stats'),
     path('profile/', views.profile_view_edit, name='profile_view_edit'), # Profile view/edit
 
     # Password Reset URLs
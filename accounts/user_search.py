@@ -0,0 +1,95 @@
+"""
+Substring search over users' usernames and emails for the admin dashboard.
+
+Results are exactly those of ``Q(username__icontains=term) | Q(email__icontains=term)``,
+but the candidates come from the trigram index set up by migration 0004 instead of
+a scan of auth_user:
+
+* PostgreSQL: the trigram GIN indexes match the ``icontains`` expressions, so the
+  plain filter is already an index scan.
+* SQLite: the rowids matching the term in the FTS5 trigram table restrict the
+  query, and ``icontains`` rechecks them (the index folds case for all of Unicode,
+  SQLite's LIKE only for ASCII, so it may return a few extra candidates).
+
+Terms shorter than three characters have no trigrams, and on SQLite terms matching
+more than MAX_CANDIDATES users are cheaper to scan for; both use the plain filter.
+"""
+import functools
+
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+SQLITE_TABLE = 'accounts_user_trigram'
+MIN_INDEXED_LENGTH = 3
+MAX_CANDIDATES = 5000
+
+
+SQLITE_TRIGGERS = {
+    f'{SQLITE_TABLE}_insert': f"""CREATE TRIGGER {SQLITE_TABLE}_insert AFTER INSERT ON auth_user BEGIN
+        INSERT INTO {SQLITE_TABLE}(rowid, username, email) VALUES (new.id, new.username, new.email);
+    END""",
+    f'{SQLITE_TABLE}_delete': f"""CREATE TRIGGER {SQLITE_TABLE}_delete AFTER DELETE ON auth_user BEGIN
+        INSERT INTO {SQLITE_TABLE}({SQLITE_TABLE}, rowid, username, email) VALUES ('delete', old.id, old.username, old.email);
+    END""",
+    f'{SQLITE_TABLE}_update': f"""CREATE TRIGGER {SQLITE_TABLE}_update AFTER UPDATE OF username, email ON auth_user BEGIN
+        INSERT INTO {SQLITE_TABLE}({SQLITE_TABLE}, rowid, username, email) VALUES ('delete', old.id, old.username, old.email);
+        INSERT INTO {SQLITE_TABLE}(rowid, username, email) VALUES (new.id, new.username, new.email);
+    END""",
+}
+
+
+def repair_sqlite_index(using='default', **kwargs):
+    """
+    post_migrate handler: SQLite drops auth_user's triggers whenever a migration
+    rebuilds that table, which would leave the trigram index silently out of date.
+    Re-create any missing trigger and rebuild the index from auth_user.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT type, name FROM sqlite_master WHERE name LIKE %s", [SQLITE_TABLE + '%'])
+        existing = {name for kind, name in cursor.fetchall()}
+        if SQLITE_TABLE not in existing:
+            return
+        missing = [sql for name, sql in SQLITE_TRIGGERS.items() if name not in existing]
+        if missing:
+            for sql in missing:
+                cursor.execute(sql)
+            cursor.execute(f"INSERT INTO {SQLITE_TABLE}({SQLITE_TABLE}) VALUES ('rebuild')")
+    _has_sqlite_index.cache_clear()
+
+
+@functools.lru_cache(maxsize=None)
+def _has_sqlite_index(alias):
+    with connections[alias].cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [SQLITE_TABLE])
+        return cursor.fetchone() is not None
+
+
+def _is_selective(alias, term):
+    # A term matching a large share of the table ("example.com") is answered faster
+    # by the plain scan than by joining a huge candidate list back to auth_user.
+    with connections[alias].cursor() as cursor:
+        cursor.execute(
+            f'SELECT COUNT(*) FROM (SELECT 1 FROM {SQLITE_TABLE} WHERE {SQLITE_TABLE} MATCH %s LIMIT %s)',
+            [_fts_phrase(term), MAX_CANDIDATES + 1],
+        )
+        return cursor.fetchone()[0] <= MAX_CANDIDATES
+
+
+def _fts_phrase(term):
+    # A quoted FTS5 phrase; with the trigram tokenizer it matches the term anywhere.
+    return '"%s"' % term.replace('"', '""')
+
+
+def filter_users(queryset, term):
+    """Narrow a User ``queryset`` to users whose username or email contains ``term``, ignoring case."""
+    matches = Q(username__icontains=term) | Q(email__icontains=term)
+    connection = connections[queryset.db]
+    if (connection.vendor == 'sqlite' and len(term) >= MIN_INDEXED_LENGTH
+            and _has_sqlite_index(queryset.db) and _is_selective(queryset.db, term)):
+        candidates = RawSQL(f'SELECT rowid FROM {SQLITE_TABLE} WHERE {SQLITE_TABLE} MATCH %s', [_fts_phrase(term)])
+        queryset = queryset.filter(pk__in=candidates)
+    return queryset.filter(matches)
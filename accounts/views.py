@@ -1,10 +1,29 @@
 from django.shortcuts import render, redirect, get_object_or_404
+import json
+from django.http import JsonResponse, StreamingHttpResponse
 from django.contrib.auth.models import User
 from .forms import RegistrationForm, UserUpdateForm, UserProfileForm # Added forms
-from .models import UserProfile # Added UserProfile model
+from .models import UserProfile, SearchJob # Added UserProfile model
 from django.contrib.auth.decorators import login_required
 from django.contrib.admin.views.decorators import staff_member_required
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.urls import reverse
+from django.utils.http import urlencode
+from django.views.decorators.http import require_POST
+from asgiref.sync import sync_to_async
 from googlesearch import search
+from .html_title import extract_title
+from .http_client import get_session, get_timeout, release
+from .titles import fetch_titles, iter_titles, aiter_titles, prefetch_titles, get_title_cache, TitleFetch, FETCH_ERROR_TITLE, PARSE_ERROR_TITLE, PENDING_TITLE
+from .search_results import result_set_key, load_result_set, save_result_set, aload_result_set, asave_result_set
+from .search_jobs import enqueue as enqueue_search_job
+from .rate_governor import get_search_governor, UpstreamBusy
+from .search_flight import coalesce, acoalesce
+from .user_search import filter_users
+from .pagination import keyset_page
+from .approvals import approve_users, reject_users
+from . import async_search
 
 def register(request):
     if request.method == 'POST':
@@ -30,7 +49,6 @@ def login_redirect(request):
     else:
         return redirect('home')
 
-from django.db.models import Q # For searching
 
 @staff_member_required
 def admin_dashboard(request):
@@ -39,10 +57,7 @@ def admin_dashboard(request):
     # Search/Filter
     search_query = request.GET.get('q', '').strip()
     if search_query:
-        pending_users_qs = pending_users_qs.filter(
-            Q(username__icontains=search_query) |
-            Q(email__icontains=search_query)
-        )
+        pending_users_qs = filter_users(pending_users_qs, search_query) # Index-backed username/email substring match
 
     # Sorting
     sort_by = request.GET.get('sort', 'date_joined') # Default sort by date_joined
@@ -52,23 +67,15 @@ def admin_dashboard(request):
         sort_by = 'date_joined' # Default to date_joined if invalid sort param
 
     order = request.GET.get('order', 'asc') # Default order asc
-    if order == 'desc':
-        sort_by_final = f'-{sort_by}'
-    else:
-        sort_by_final = sort_by
+    if order != 'desc':
         order = 'asc' # Ensure order is 'asc' if not 'desc'
 
-    pending_users_qs = pending_users_qs.order_by(sort_by_final)
-
-    # Pagination for admin dashboard (good practice if many pending users)
-    paginator = Paginator(pending_users_qs, 15) # Show 15 users per page
-    page_number = request.GET.get('page')
-    try:
-        pending_users_page = paginator.page(page_number)
-    except PageNotAnInteger:
-        pending_users_page = paginator.page(1)
-    except EmptyPage:
-        pending_users_page = paginator.page(paginator.num_pages)
+    # Keyset pagination: pages follow cursors instead of counting and OFFSET-scanning
+    # all pending users; ties on the sort column are broken by id.
+    pending_users_page = keyset_page(
+        pending_users_qs, sort_by, descending=(order == 'desc'), per_page=15, # Show 15 users per page
+        after=request.GET.get('after'), before=request.GET.get('before'),
+    )
 
     context = {
         'pending_users_page': pending_users_page,
@@ -92,93 +99,485 @@ def reject_user(request, user_id):
     user.delete()
     return redirect('admin_dashboard')
 
+@staff_member_required
+@require_POST
+def bulk_user_action(request):
+    """
+    Approve or reject many pending users at once: the ticked ones, or (scope=all)
+    every pending user matching the dashboard's current search. Runs as batched
+    set-based writes (see accounts/approvals.py) and reports the counts.
+    """
+    from django.contrib import messages
+    action = request.POST.get('action')
+    search_query = request.POST.get('q', '').strip()
+
+    # approve_users() and reject_users() only ever touch the pending users among these.
+    if request.POST.get('scope') == 'all':
+        users = User.objects.all()
+        if search_query:
+            users = filter_users(users, search_query)
+    else:
+        ids = [int(pk) for pk in request.POST.getlist('user_ids') if pk.isdecimal()]
+        users = User.objects.filter(pk__in=ids) if ids else None
+
+    if users is None:
+        messages.warning(request, 'No users were selected.')
+    elif action == 'approve':
+        messages.success(request, f'Approved {approve_users(users)} user(s).')
+    elif action == 'reject':
+        messages.success(request, f'Rejected and deleted {reject_users(users)} user(s).')
+    else:
+        messages.error(request, 'Unknown action.')
+
+    # Back to the same view of the dashboard.
+    params = {name: request.POST[name] for name in ('q', 'sort', 'order') if request.POST.get(name)}
+    return redirect(reverse('admin_dashboard') + (f'?{urlencode(params)}' if params else ''))
+
 import requests
-from bs4 import BeautifulSoup
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 
 # Helper function to get title from URL
 def get_title_from_url(url):
+    # Popular URLs come back across many searches, so serve them from the title cache.
+    return get_title_cache().get_or_fetch(url, _fetch_title_from_url)
+
+def _fetch_title_from_url(url, etag=None, last_modified=None):
+    # Conditional request when we have validators from an earlier fetch: a 304
+    # costs a round trip but no body download or parsing.
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
     try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        response = requests.get(url, headers=headers, timeout=5, allow_redirects=True)
-        response.raise_for_status() # Raise an exception for HTTP errors
-        soup = BeautifulSoup(response.content, 'html.parser')
-        title_tag = soup.find('title')
-        return title_tag.string.strip() if title_tag and title_tag.string else "No title found"
+        # Stream the body and stop at </title> (or SEARCH_TITLE_MAX_BYTES) instead of
+        # downloading and parsing the whole page.
+        response = get_session().get(url, headers=headers, timeout=get_timeout(), allow_redirects=True, stream=True)
+        try:
+            if response.status_code == 304:
+                return TitleFetch(None, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+            response.raise_for_status() # Raise an exception for HTTP errors
+            title = extract_title(response, max_bytes=settings.SEARCH_TITLE_MAX_BYTES)
+            return TitleFetch(title or "No title found", response.headers.get('ETag'), response.headers.get('Last-Modified'))
+        finally:
+            release(response) # Keep the pooled connection reusable
     except requests.exceptions.RequestException as e:
         # Log e for debugging
         # print(f"Error fetching {url}: {e}")
-        return "Could not fetch title"
+        return TitleFetch(FETCH_ERROR_TITLE)
     except Exception: # Catch other parsing errors
-        return "Error parsing title"
+        return TitleFetch(PARSE_ERROR_TITLE)
+
+
+@staff_member_required
+def title_cache_stats(request):
+    # Counters are per worker process; the pid in the payload says which one answered.
+    return JsonResponse(get_title_cache().stats())
+
+
+@staff_member_required
+def search_governor_stats(request):
+    # Queue-wait metrics are per worker process; the rate itself is shared.
+    return JsonResponse(get_search_governor().stats())
+
+
+SEARCH_RESULTS_PER_PAGE = 5
+# Background searches store the query in SearchJob.query, a varchar of this length.
+SEARCH_QUERY_MAX_LENGTH = SearchJob._meta.get_field('query').max_length
+
+def _search_upstream(query):
+    """
+    The one place the googlesearch library is called; the async views run it in a
+    worker thread, so both paths scrape results the same way.
+    """
+    return list(search(query, num_results=20, lang='en'))
+
+
+def _search_results(query):
+    """The upstream search, paced by the shared rate governor (which may raise UpstreamBusy)."""
+    raw_urls = get_search_governor().call(_search_upstream, query)
+    return [{'url': url, 'title': PENDING_TITLE} for url in raw_urls]
+
+
+def _run_search(query):
+    """
+    Run the upstream search. Returns (results, error_message); titles start out
+    pending and are resolved a page at a time by _resolve_titles().
+    """
+    try:
+        return _search_results(query), None
+
+    except ImportError:
+        return [], "Search library is not configured correctly. Please contact support."
+    except Exception as e:
+        # Consider logging 'e' here: logger.error(...)
+        return [], _search_error(e)
+
+
+def _search_page(query, request=None):
+    """
+    The work shared by coalesced duplicate searches: run the search and resolve the
+    titles for the page ``request`` is about to show (if given). coalesce() stores it.
+    """
+    results, error_message = _run_search(query)
+    if error_message is None and request is not None:
+        _resolve_titles(_results_page(request, results).object_list)
+    return results, error_message
+
+
+async def _asearch_page(query, request=None):
+    """_search_page() for the async search path."""
+    try:
+        raw_urls = await get_search_governor().acall(sync_to_async(_search_upstream, thread_sensitive=False), query)
+    except Exception as e:
+        return [], _search_error(e)
+    results = [{'url': url, 'title': PENDING_TITLE} for url in raw_urls]
+    if request is not None:
+        await async_search.resolve_titles(_results_page(request, results).object_list)
+    return results, None
+
+
+def _search_error(e):
+    if isinstance(e, UpstreamBusy):
+        return f"The search service is busy right now. Please try again in {max(1, round(e.retry_after))} seconds."
+    return f"An error occurred during the search: {str(e)}. This could be due to network issues or search restrictions. Please try again later."
+
+
+def _resolve_titles(items):
+    """
+    Fetch titles for the still-pending ``items`` (in place), concurrently and bounded
+    by the title deadline. Returns True if any title changed.
+    """
+    pending = [item for item in items if item['title'] == PENDING_TITLE]
+    if not pending:
+        return False
+    resolved = fetch_titles(
+        [item['url'] for item in pending],
+        get_title_from_url,
+        deadline=settings.SEARCH_TITLE_DEADLINE,
+        max_workers=settings.SEARCH_TITLE_WORKERS,
+        per_host_limit=settings.SEARCH_TITLE_PER_HOST,
+    )
+    changed = False
+    for item, result in zip(pending, resolved):
+        if result['title'] != PENDING_TITLE:
+            item['title'] = result['title']
+            changed = True
+    return changed
+
+
+def _prefetch_next_page(results_page):
+    # Warm the title cache for the next page in the background so it renders
+    # instantly if the user goes there.
+    if not settings.SEARCH_PREFETCH_NEXT_PAGE or not results_page.has_next():
+        return
+    next_items = results_page.paginator.page(results_page.next_page_number()).object_list
+    urls = [item['url'] for item in next_items if item['title'] == PENDING_TITLE]
+    if urls:
+        prefetch_titles(urls, get_title_from_url, max_workers=settings.SEARCH_PREFETCH_WORKERS)
+
+
+def _search_request(request):
+    """
+    Read the search form / pagination parameters. Returns (query, result_key);
+    query is None for an empty search POST. Shared by the sync and async search views.
+    """
+    if request.method == 'POST':
+        query = request.POST.get('query', '').strip()
+        if not query:
+            request.session.pop('search_results', None)
+            return None, None
+        if _query_error(query):
+            return None, None
+        return query, result_set_key(query)
+
+    # GET: the URL decides what is shown, so a shared or bookmarked link shows the
+    # same results to anyone: its query if it has one, else the result set it names.
+    # Only a bare /search/ falls back to the user's last search. The page number only
+    # ever comes from the URL, so paging never writes the session.
+    query = request.GET.get('query', '').strip()
+    if query and not _query_error(query):
+        return query, result_set_key(query)
+    return '', request.GET.get('rs') or request.session.get('search_results')
+
+
+def _query_error(query):
+    """Why ``query`` can't be searched, or None if it can."""
+    if not query:
+        return "Please enter a search term."
+    if len(query) > SEARCH_QUERY_MAX_LENGTH:
+        return f"Search terms can be at most {SEARCH_QUERY_MAX_LENGTH} characters long."
+    return None
+
+
+def _remember_result_set(request, result_key):
+    # Assigning marks the session modified (one UPDATE per request with the db
+    # backend) even if the value is the same, so only assign a new key.
+    if request.session.get('search_results') != result_key:
+        request.session['search_results'] = result_key
+
+
+def _results_page(request, processed_results):
+    paginator = Paginator(processed_results, SEARCH_RESULTS_PER_PAGE) # Show 5 detailed results per page
+    page_to_display = request.GET.get('page', 1) if request.method == 'GET' else 1 # A new search starts on page 1
+    try:
+        return paginator.page(page_to_display)
+    except PageNotAnInteger:
+        return paginator.page(1)
+    except EmptyPage:
+        return paginator.page(paginator.num_pages)
+
+
+def _render_search(request, results_page_obj, query, result_key, error_message, search_job=None, search_stream=False):
+    return render(request, 'search.html', {
+        'results_page': results_page_obj,
+        'query': query,
+        'result_key': result_key if query else None,
+        'titles_pending': any(item['title'] == PENDING_TITLE for item in results_page_obj),
+        'search_job': search_job,
+        'search_stream': search_stream,
+        'error_message': error_message,
+        'query_max_length': SEARCH_QUERY_MAX_LENGTH,
+        'page_title': 'Web Search'
+    })
+
+
+def _background_search(request, query, result_key):
+    # SEARCH_BACKGROUND: queue the search for run_search_workers and return right
+    # away; the page polls search_job_status and shows results as they come in.
+    job = enqueue_search_job(request.user, query)
+    _remember_result_set(request, result_key)
+    return _render_search(request, [], query, result_key, None, search_job=job)
 
 
 @login_required
 def search_view(request):
     processed_results = [] # Will store list of {'url': ..., 'title': ...}
-    query = ""
     error_message = None
     results_page_obj = [] # Ensure results_page_obj is defined
+    result_set_changed = False
+
+    query, result_key = _search_request(request)
+    if query is None:
+        error_message = _query_error(request.POST['query'].strip()) if 'query' in request.POST else None
+        return _render_search(request, results_page_obj, '', None, error_message)
+
+    # Pagination only slices the stored result set; the search itself runs once
+    # per query (per SEARCH_RESULTS_TTL) no matter how many pages are viewed.
+    result_set = load_result_set(result_key)
+
+    if result_set is None and query and settings.SEARCH_BACKGROUND:
+        return _background_search(request, query, result_key)
+    if result_set is None and query and settings.SEARCH_STREAM:
+        # The page renders right away and fills itself from search_stream.
+        _remember_result_set(request, result_key)
+        return _render_search(request, [], query, result_key, None, search_stream=True)
+
+    if result_set is not None:
+        query = query or result_set['query']
+        processed_results = result_set['results']
+    elif query:
+        # Identical searches running at the same time share one upstream search.
+        processed_results, error_message = coalesce(result_key, query, lambda: _search_page(query, request))
 
-    if request.method == 'POST':
-        query = request.POST.get('query', '').strip()
-        if query:
-            request.session['search_query'] = query
-            request.session.pop('page', None) # Clear page on new search
-        else:
-            request.session.pop('search_query', None)
-            if 'query' in request.POST:
-                error_message = "Please enter a search term."
-            return render(request, 'search.html', {'query': query, 'error_message': error_message, 'results_page': results_page_obj, 'page_title': 'Web Search'})
+    if query:
+        _remember_result_set(request, result_key)
+
+    if processed_results:
+        results_page_obj = _results_page(request, processed_results)
+        # Only the titles on the page being shown are fetched now; the rest load when
+        # their page is visited (or through search_titles from the page's script).
+        if _resolve_titles(results_page_obj.object_list):
+            result_set_changed = True
+        _prefetch_next_page(results_page_obj)
+
+    if result_set_changed:
+        save_result_set(result_key, query, processed_results)
+
+    return _render_search(request, results_page_obj, query, result_key, error_message)
+
+
+async def search_view_async(request):
+    """
+    search_view for ASGI deployments (SEARCH_ASYNC). The upstream search and the
+    title fetches run as coroutines on the event loop, so a search waiting on the
+    network doesn't hold a thread. Only loading the user (and with it the session)
+    runs in a worker thread, since that may query the database.
+    """
+    if not await sync_to_async(_is_authenticated)(request):
+        return redirect_to_login(request.get_full_path())
+
+    processed_results = []
+    error_message = None
+    results_page_obj = []
+    result_set_changed = False
 
-    elif request.method == 'GET':
-        query = request.session.get('search_query', '').strip()
-        page_number_from_get = request.GET.get('page')
-        if page_number_from_get:
-            request.session['page'] = page_number_from_get
+    query, result_key = _search_request(request)
+    if query is None:
+        error_message = _query_error(request.POST['query'].strip()) if 'query' in request.POST else None
+        return _render_search(request, results_page_obj, '', None, error_message)
+
+    result_set = await aload_result_set(result_key)
+
+    if result_set is None and query and settings.SEARCH_BACKGROUND:
+        return await sync_to_async(_background_search)(request, query, result_key)
+    if result_set is None and query and settings.SEARCH_STREAM:
+        _remember_result_set(request, result_key)
+        return _render_search(request, [], query, result_key, None, search_stream=True)
+
+    if result_set is not None:
+        query = query or result_set['query']
+        processed_results = result_set['results']
+    elif query:
+        processed_results, error_message = await acoalesce(result_key, query, lambda: _asearch_page(query, request))
 
     if query:
-        try:
-            # Fetch raw URLs from googlesearch
-            raw_urls = list(search(query, num_results=20, lang='en', stop=20, pause=1.0)) # Reduced num_results, added pause
-
-            # Process URLs to get titles (this can be slow)
-            # For a better UX, this part could be done asynchronously or titles fetched on demand.
-            # For simplicity now, fetching directly.
-            for url in raw_urls:
-                title = get_title_from_url(url)
-                processed_results.append({'url': url, 'title': title})
-
-        except ImportError:
-            error_message = "Search library is not configured correctly. Please contact support."
-        except Exception as e:
-            error_message = f"An error occurred during the search: {str(e)}. This could be due to network issues or search restrictions. Please try again later."
-            # Consider logging 'e' here: logger.error(...)
+        _remember_result_set(request, result_key)
 
     if processed_results:
-        paginator = Paginator(processed_results, 5) # Show 5 detailed results per page
-        page_to_display = request.session.get('page', 1) # Get page from session or default to 1
-        try:
-            results_page_obj = paginator.page(page_to_display)
-        except PageNotAnInteger:
-            results_page_obj = paginator.page(1)
-            request.session['page'] = 1
-        except EmptyPage:
-            results_page_obj = paginator.page(paginator.num_pages)
-            request.session['page'] = paginator.num_pages
+        results_page_obj = _results_page(request, processed_results)
+        if await async_search.resolve_titles(results_page_obj.object_list):
+            result_set_changed = True
+        if settings.SEARCH_PREFETCH_NEXT_PAGE and results_page_obj.has_next():
+            next_items = results_page_obj.paginator.page(results_page_obj.next_page_number()).object_list
+            async_search.prefetch_titles([item['url'] for item in next_items if item['title'] == PENDING_TITLE])
 
-    # Update page in session for next GET request if it changed
-    if results_page_obj and hasattr(results_page_obj, 'number'):
-         request.session['page'] = results_page_obj.number
+    if result_set_changed:
+        await asave_result_set(result_key, query, processed_results)
 
+    return _render_search(request, results_page_obj, query, result_key, error_message)
 
-    return render(request, 'search.html', {
-        'results_page': results_page_obj,
-        'query': query,
-        'error_message': error_message,
-        'page_title': 'Web Search'
+
+def _is_authenticated(request):
+    # Resolving request.user loads the session and the user row.
+    return request.user.is_authenticated
+
+
+def _sse(event, data):
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+def _event_stream(events):
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no' # Stop nginx from buffering the events
+    return response
+
+
+def _search_events(query, result_key):
+    """
+    Server-sent events for one search: ``results`` with the result URLs as soon as
+    the upstream search returns, a ``title`` per result as its title resolves (in
+    the order they finish), then ``done``; or ``failed`` if the search fails.
+    """
+    result_set = load_result_set(result_key)
+    if result_set is not None:
+        results = result_set['results']
+    else:
+        results, error_message = coalesce(result_key, query, lambda: _search_page(query))
+        if error_message:
+            yield _sse('failed', {'error': error_message})
+            return
+    yield _sse('results', {'result_key': result_key, 'results': results})
+
+    pending = [index for index, item in enumerate(results) if item['title'] == PENDING_TITLE]
+    titles = iter_titles(
+        [results[index]['url'] for index in pending],
+        get_title_from_url,
+        deadline=settings.SEARCH_STREAM_DEADLINE,
+        max_workers=settings.SEARCH_TITLE_WORKERS,
+        per_host_limit=settings.SEARCH_TITLE_PER_HOST,
+    )
+    for position, title in titles:
+        index = pending[position]
+        results[index]['title'] = title
+        yield _sse('title', {'index': index, 'title': title})
+
+    save_result_set(result_key, query, results)
+    yield _sse('done', {'result_key': result_key})
+
+
+async def _asearch_events(query, result_key):
+    """_search_events() for the async search path."""
+    result_set = await aload_result_set(result_key)
+    if result_set is not None:
+        results = result_set['results']
+    else:
+        results, error_message = await acoalesce(result_key, query, lambda: _asearch_page(query))
+        if error_message:
+            yield _sse('failed', {'error': error_message})
+            return
+    yield _sse('results', {'result_key': result_key, 'results': results})
+
+    pending = [index for index, item in enumerate(results) if item['title'] == PENDING_TITLE]
+    titles = aiter_titles(
+        [results[index]['url'] for index in pending],
+        async_search.get_title,
+        deadline=settings.SEARCH_STREAM_DEADLINE,
+        max_concurrency=settings.SEARCH_TITLE_WORKERS,
+        per_host_limit=settings.SEARCH_TITLE_PER_HOST,
+    )
+    async for position, title in titles:
+        index = pending[position]
+        results[index]['title'] = title
+        yield _sse('title', {'index': index, 'title': title})
+
+    await asave_result_set(result_key, query, results)
+    yield _sse('done', {'result_key': result_key})
+
+
+@login_required
+def search_stream(request):
+    """Stream a search's results as server-sent events (SEARCH_STREAM); see _search_events()."""
+    query = request.GET.get('query', '').strip()
+    if _query_error(query):
+        return JsonResponse({'error': _query_error(query)}, status=400)
+    return _event_stream(_search_events(query, result_set_key(query)))
+
+
+async def search_stream_async(request):
+    if not await sync_to_async(_is_authenticated)(request):
+        return redirect_to_login(request.get_full_path())
+    query = request.GET.get('query', '').strip()
+    if _query_error(query):
+        return JsonResponse({'error': _query_error(query)}, status=400)
+    return _event_stream(_asearch_events(query, result_set_key(query)))
+
+
+@login_required
+def search_job_status(request, job_id):
+    """JSON progress of one of the user's background searches; polled by the search page."""
+    job = get_object_or_404(SearchJob, pk=job_id, user=request.user)
+    return JsonResponse({
+        'status': job.status,
+        'finished': job.is_finished,
+        'results': job.results,
+        'error': job.error_message,
+    })
+
+
+@login_required
+def search_titles(request):
+    """
+    JSON titles for one page of a stored result set, so the search page can fill in
+    titles that were still loading when it was rendered.
+    """
+    result_key = request.GET.get('rs')
+    result_set = load_result_set(result_key)
+    if result_set is None:
+        return JsonResponse({'error': 'These search results have expired. Please search again.'}, status=404)
+
+    paginator = Paginator(result_set['results'], SEARCH_RESULTS_PER_PAGE)
+    results_page = paginator.get_page(request.GET.get('page'))
+    if _resolve_titles(results_page.object_list):
+        save_result_set(result_key, result_set['query'], result_set['results'])
+
+    return JsonResponse({
+        'page': results_page.number,
+        'results': [
+            {'url': item['url'], 'title': item['title'], 'pending': item['title'] == PENDING_TITLE}
+            for item in results_page.object_list
+        ],
     })
 
 @login_required
@@ -189,8 +588,11 @@ def profile_view_edit(request):
         'first_name': request.user.first_name,
         'last_name': request.user.last_name,
     }
-    # Ensure profile exists, though the signal should handle this.
-    profile, created = UserProfile.objects.get_or_create(user=request.user)
+    # A plain read, so that viewing the profile can use a replica; the profile is only
+    # created here for accounts that predate the signal which creates it.
+    profile = UserProfile.objects.filter(user=request.user).first()
+    if profile is None:
+        profile, created = UserProfile.objects.get_or_create(user=request.user)
 
     if request.method == 'POST':
         user_form = UserUpdateForm(request.POST, instance=request.user)
@@ -0,0 +1,106 @@
+"""
+Benchmark: admin_dashboard's username/email substring search with and without
+the trigram index (accounts/user_search.py), on SQLite.
+
+Builds a throwaway database with --users accounts (a third of them pending
+approval), then times what the dashboard runs for a search: the first page of 15
+users ordered by date_joined, once with the plain ``icontains`` filter (a full
+scan of auth_user) and once through filter_users(). Both must return the same
+rows; the number of matches is counted separately, outside the timings.
+
+Usage (from the project root):
+    python benchmarks/dashboard_search.py --users 1000000
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+TERMS = [
+    ('selective username', 'user-0424242'),
+    ('selective email', 'mail-777777.example'),
+    ('few matches', 'user-00012'),
+    ('no match', 'nobody-here'),
+    ('common (every email)', 'example.com'),
+    ('two characters (not indexed)', '42'),
+]
+
+
+def setup_django(database):
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'rubik.settings'
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    from django.conf import settings
+    settings.DATABASES['default']['NAME'] = database
+    import django
+    django.setup()
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+
+def populate(count, batch=20000):
+    from django.db import connection, transaction
+    started = time.perf_counter()
+    with transaction.atomic(), connection.cursor() as cursor:
+        for first in range(0, count, batch):
+            rows = [
+                (f'user-{i:07d}', f'mail-{i:06d}.{("example", "work", "home")[i % 3]}@example.com',
+                 '!', False, False, i % 3 != 0, str(datetime(2024, 1, 1) + timedelta(seconds=i)), '', '')
+                for i in range(first, min(count, first + batch))
+            ]
+            cursor.executemany(
+                'INSERT INTO auth_user (username, email, password, is_superuser, is_staff, is_active, date_joined,'
+                ' first_name, last_name) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)',
+                rows,
+            )
+    return time.perf_counter() - started
+
+
+def dashboard_query(queryset):
+    from accounts.pagination import keyset_page
+    return [user.pk for user in keyset_page(queryset, 'date_joined', per_page=15)]
+
+
+def timed(func, repeat):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - started)
+    return result, statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per query (the median is reported)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        setup_django(os.path.join(tmp, 'bench.sqlite3'))
+        from django.contrib.auth.models import User
+        from django.db.models import Q
+        from accounts.user_search import filter_users
+
+        print(f'Inserting {args.users:,} users (index maintained by triggers)... ', end='', flush=True)
+        print(f'{populate(args.users):.1f}s')
+        pending = User.objects.filter(is_active=False)
+        print(f'{"search":<32}{"matches":>9}{"scan ms":>11}{"indexed ms":>12}{"speed-up":>10}')
+        for label, term in TERMS:
+            scan, scan_time = timed(lambda: dashboard_query(
+                pending.filter(Q(username__icontains=term) | Q(email__icontains=term))), args.repeat)
+            indexed, indexed_time = timed(lambda: dashboard_query(filter_users(pending, term)), args.repeat)
+            assert scan == indexed, f'results differ for {term!r}'
+            matches = filter_users(pending, term).count()
+            print(f'{label:<32}{matches:>9,}{scan_time * 1000:>11.1f}{indexed_time * 1000:>12.1f}'
+                  f'{scan_time / indexed_time:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
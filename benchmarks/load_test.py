@@ -0,0 +1,378 @@
+"""
+End-to-end HTTP load test: concurrent virtual users run realistic scenarios
+against the site and the latency percentiles, throughput and error rate of every
+endpoint are reported as JSON, so runs can be saved and compared.
+
+Scenarios (each virtual user cycles through the selected ones):
+  * login: login form, credentials POST, login_redirect, home
+  * search: a search POST, then page 2 of its results (queries come from a small
+    pool, so repeats hit the stored result sets like real traffic does)
+  * dashboard: admin_dashboard as a staff user, with random filters, sort and order
+  * profile: the profile page, then a profile update POST
+
+By default the script runs the whole thing itself: a throwaway SQLite database
+with --users regular accounts, a staff account and --pending unapproved signups, a
+fake search engine plus fake result sites (see search_throughput.FakeUpstream) so
+searches never leave the machine, and the WSGI application on a threaded server in
+a child process. With --base-url it targets an already running instance instead,
+using the accounts given on the command line (scenarios without an account are
+skipped); searches then go wherever that instance sends them.
+
+Usage (from the project root):
+    python benchmarks/load_test.py --users 20 --duration 30 --output run.json
+    python benchmarks/load_test.py --base-url http://127.0.0.1:8000 --username alice --password ... \
+        --staff-username admin --staff-password ... --scenarios login,dashboard
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import requests
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from search_throughput import FakeUpstream  # noqa: E402  (same directory)
+
+SCENARIOS = ('login', 'search', 'dashboard', 'profile')
+CSRF_RE = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+NEXT_CURSOR_RE = re.compile(r'href="\?after=([^&"]+)')
+QUERIES = ['django performance', 'python asyncio', 'sqlite wal mode', 'http keep-alive', 'token bucket',
+           'gunicorn workers', 'cache stampede', 'keyset pagination', 'webp images', 'brotli compression']
+PASSWORD = 'load-test-password'
+
+
+class Recorder:
+    """Thread-safe latency samples per endpoint."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples = defaultdict(list)  # name -> [(seconds, ok)]
+
+    def add(self, name, seconds, ok):
+        with self._lock:
+            self._samples[name].append((seconds, ok))
+
+    def report(self, elapsed):
+        with self._lock:
+            samples = {name: list(values) for name, values in self._samples.items()}
+        endpoints = {name: summarize(values, elapsed) for name, values in sorted(samples.items())}
+        # Logins done only to set up a session for another scenario are left out of the total.
+        measured = [values for name, values in samples.items() if not name.startswith('setup_')]
+        return endpoints, summarize(list(itertools.chain.from_iterable(measured)), elapsed)
+
+
+def percentile(sorted_values, p):
+    # Nearest-rank percentile.
+    index = max(0, min(len(sorted_values) - 1, int(round(p / 100 * len(sorted_values) + 0.5)) - 1))
+    return round(sorted_values[index] * 1000, 1)
+
+
+def summarize(values, elapsed):
+    latencies = sorted(seconds for seconds, ok in values)
+    errors = sum(1 for seconds, ok in values if not ok)
+    if not latencies:
+        return {'requests': 0}
+    return {
+        'requests': len(values),
+        'errors': errors,
+        'error_rate': round(errors / len(values), 4),
+        'throughput_rps': round(len(values) / elapsed, 2),
+        'p50_ms': percentile(latencies, 50),
+        'p95_ms': percentile(latencies, 95),
+        'p99_ms': percentile(latencies, 99),
+        'max_ms': round(latencies[-1] * 1000, 1),
+    }
+
+
+class VirtualUser:
+    def __init__(self, base_url, recorder, account, staff_account, rng):
+        self.base_url = base_url.rstrip('/')
+        self.recorder = recorder
+        self.account = account
+        self.staff_account = staff_account
+        self.rng = rng
+        self.session = requests.Session()
+        self.staff_session = requests.Session()
+        self.logged_in = set()
+
+    def request(self, name, session, method, path, ok_statuses=(200,), **kwargs):
+        started = time.perf_counter()
+        try:
+            response = session.request(method, self.base_url + path, allow_redirects=False, timeout=60, **kwargs)
+        except requests.RequestException:
+            self.recorder.add(name, time.perf_counter() - started, False)
+            return None
+        self.recorder.add(name, time.perf_counter() - started, response.status_code in ok_statuses)
+        return response
+
+    def login(self, session, account, name_prefix=''):
+        session.cookies.clear()
+        form = self.request(name_prefix + 'login_form', session, 'GET', '/accounts/login/')
+        token = csrf_token(form)
+        if token is None:
+            return False
+        response = self.request(name_prefix + 'login', session, 'POST', '/accounts/login/', ok_statuses=(302,), data={
+            'username': account[0], 'password': account[1], 'csrfmiddlewaretoken': token,
+        }, headers={'Referer': self.base_url + '/accounts/login/'})
+        return response is not None and response.status_code == 302
+
+    def ensure_login(self, session, account):
+        # Setting up a session for the other scenarios isn't part of their measurements.
+        if id(session) not in self.logged_in:
+            if not self.login(session, account, name_prefix='setup_'):
+                return False
+            self.logged_in.add(id(session))
+        return True
+
+    def scenario_login(self):
+        if self.login(self.session, self.account):
+            self.request('login_redirect', self.session, 'GET', '/accounts/login_redirect/', ok_statuses=(302,))
+            self.request('home', self.session, 'GET', '/accounts/')
+            self.logged_in.add(id(self.session))
+
+    def scenario_search(self):
+        if not self.ensure_login(self.session, self.account):
+            return
+        form = self.request('search_form', self.session, 'GET', '/accounts/search/')
+        token = csrf_token(form)
+        if token is None:
+            return
+        query = self.rng.choice(QUERIES)
+        self.request('search', self.session, 'POST', '/accounts/search/', data={
+            'query': query, 'csrfmiddlewaretoken': token,
+        }, headers={'Referer': self.base_url + '/accounts/search/'})
+        self.request('search_page', self.session, 'GET', '/accounts/search/', params={'page': 2, 'query': query})
+
+    def scenario_dashboard(self):
+        if not self.ensure_login(self.staff_session, self.staff_account):
+            return
+        params = {
+            'sort': self.rng.choice(['username', 'email', 'date_joined']),
+            'order': self.rng.choice(['asc', 'desc']),
+        }
+        if self.rng.random() < 0.5:
+            params['q'] = self.rng.choice(['pending-1', 'example', '42', 'zzz'])
+        # The first page, then up to two more by following the "next" cursor.
+        for _ in range(self.rng.randint(1, 3)):
+            response = self.request('admin_dashboard', self.staff_session, 'GET', '/accounts/admin_dashboard/', params=params)
+            match = NEXT_CURSOR_RE.search(response.text) if response is not None else None
+            if match is None:
+                break
+            params['after'] = match.group(1)
+
+    def scenario_profile(self):
+        if not self.ensure_login(self.session, self.account):
+            return
+        page = self.request('profile', self.session, 'GET', '/accounts/profile/')
+        token = csrf_token(page)
+        if token is None:
+            return
+        self.request('profile_update', self.session, 'POST', '/accounts/profile/', ok_statuses=(302,), data={
+            'username': self.account[0], 'email': f'{self.account[0]}@example.com',
+            'first_name': 'Load', 'last_name': f'Test {self.rng.randint(0, 10**6)}',
+            'bio': 'Updated by the load test.', 'csrfmiddlewaretoken': token,
+        }, headers={'Referer': self.base_url + '/accounts/profile/'})
+
+
+def csrf_token(response):
+    if response is None or response.status_code != 200:
+        return None
+    match = CSRF_RE.search(response.text)
+    return match.group(1) if match else None
+
+
+def run_load(args, base_url, accounts, staff_account, scenarios):
+    recorder = Recorder()
+    stop_at = time.monotonic() + args.duration
+
+    def user_loop(i):
+        user = VirtualUser(base_url, recorder, accounts[i % len(accounts)], staff_account, random.Random(args.seed + i))
+        runnable = [name for name in scenarios if name != 'dashboard' or staff_account]
+        for name in itertools.cycle(runnable[i % len(runnable):] + runnable[:i % len(runnable)]):
+            if time.monotonic() >= stop_at:
+                break
+            getattr(user, f'scenario_{name}')()
+
+    threads = [threading.Thread(target=user_loop, args=(i,)) for i in range(args.users)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    endpoints, total = recorder.report(elapsed)
+    return {'seconds': round(elapsed, 2), 'total': total, 'endpoints': endpoints}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def prepare_database(database, users, pending):
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE='rubik.settings', SECRET_KEY=os.environ.get('SECRET_KEY', 'load-test'))
+    script = (
+        "import sys; from django.conf import settings; settings.DATABASES['default']['NAME'] = sys.argv[1]; "
+        "import django; django.setup(); from django.core.management import call_command; "
+        "call_command('migrate', verbosity=0); from django.contrib.auth.models import User; "
+        "from django.contrib.auth.hashers import make_password; password = make_password(sys.argv[4]); "
+        "User.objects.bulk_create([User(username=f'load-user-{i}', email=f'load-user-{i}@example.com', password=password) "
+        "for i in range(int(sys.argv[2]))]); "
+        "User.objects.create(username='load-staff', password=password, is_staff=True); "
+        "User.objects.bulk_create([User(username=f'pending-{i}', email=f'pending-{i}@example.com', is_active=False) "
+        "for i in range(int(sys.argv[3]))], batch_size=1000)"
+    )
+    subprocess.run([sys.executable, '-c', script, database, str(users), str(pending), PASSWORD],
+                   cwd=ROOT, env=env, check=True)
+
+
+def serve(args):
+    """Child process: the WSGI application on a threaded server, searching the fake upstream."""
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'rubik.settings'
+    os.environ.setdefault('SECRET_KEY', 'load-test')
+    os.environ['SEARCH_TITLE_PER_HOST'] = '8'  # The fake sites all share the 127.0.0.1 hostname
+    # The fake upstream doesn't rate limit, and the test is about the site, not the governor.
+    os.environ['SEARCH_RATE'] = '1000'
+    os.environ['SEARCH_RATE_BURST'] = '1000'
+    # A thread per connection here, so no bulkhead shedding unless asked for in the environment.
+    os.environ.setdefault('BULKHEAD_SEARCH', '0')
+    os.environ.setdefault('BULKHEAD_DEFAULT', '0')
+
+    from django.conf import settings
+    settings.DATABASES['default']['NAME'] = args.database
+
+    import django
+    django.setup()
+
+    from socketserver import ThreadingMixIn
+    from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+    from accounts import views
+    from rubik.wsgi import application
+
+    def fake_search(query, num_results=20, lang='en', **kwargs):
+        # The fake upstream answers with one result URL per line.
+        response = requests.get(f'{args.upstream}/search', params={'q': query}, timeout=30)
+        return response.text.splitlines()[:num_results]
+
+    views.search = fake_search
+
+    class Server(ThreadingMixIn, WSGIServer):
+        daemon_threads = True
+        request_queue_size = 256
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_message(self, *args):
+            pass
+
+    make_server('127.0.0.1', args.port, application, server_class=Server, handler_class=QuietHandler).serve_forever()
+
+
+def wait_for_server(base_url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.get(base_url + '/accounts/login/', timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f'Server at {base_url} did not come up')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=10, help='Concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=20.0, help='Seconds to run')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help=f'Comma-separated subset of {",".join(SCENARIOS)}')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Also write the JSON report to this file')
+    parser.add_argument('--base-url', help='Test a running instance instead of starting one')
+    parser.add_argument('--username', help='Regular account to use with --base-url')
+    parser.add_argument('--password')
+    parser.add_argument('--staff-username', help='Staff account for the dashboard scenario with --base-url')
+    parser.add_argument('--staff-password')
+    parser.add_argument('--pending', type=int, default=2000, help='Unapproved signups in the generated database')
+    parser.add_argument('--latency', type=float, default=0.2, help='Fake upstream delay per request, seconds')
+    parser.add_argument('--sites', type=int, default=20, help='Distinct fake sites search results point at')
+    parser.add_argument('--server-log', help="Write the started server's log here (it is discarded otherwise)")
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--upstream', help=argparse.SUPPRESS)
+    parser.add_argument('--database', help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f'unknown scenarios: {", ".join(sorted(unknown))}')
+
+    server = upstream = tmp = log = None
+    if args.base_url:
+        base_url = args.base_url
+        if not args.username:
+            scenarios = [name for name in scenarios if name == 'dashboard']
+        accounts = [(args.username, args.password)]
+        staff_account = (args.staff_username, args.staff_password) if args.staff_username else None
+    else:
+        tmp = tempfile.TemporaryDirectory()
+        database = os.path.join(tmp.name, 'load.sqlite3')
+        prepare_database(database, args.users, args.pending)
+        upstream = FakeUpstream(args.latency, args.sites)
+        port = free_port()
+        base_url = f'http://127.0.0.1:{port}'
+        log = open(args.server_log, 'w') if args.server_log else subprocess.DEVNULL
+        server = subprocess.Popen(
+            [sys.executable, __file__, '--serve', '--upstream', upstream.base_url, '--database', database, '--port', str(port)],
+            cwd=ROOT, stdout=log, stderr=subprocess.STDOUT,
+        )
+        accounts = [(f'load-user-{i}', PASSWORD) for i in range(args.users)]
+        staff_account = ('load-staff', PASSWORD)
+
+    try:
+        if server is not None:
+            wait_for_server(base_url)
+        if not scenarios or (scenarios == ['dashboard'] and not staff_account):
+            parser.error('no scenario can run with the accounts given')
+        result = run_load(args, base_url, accounts, staff_account, scenarios)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        if args.server_log and log is not None:
+            log.close()
+        if upstream is not None:
+            upstream.stop()
+        if tmp is not None:
+            tmp.cleanup()
+
+    report = {
+        'target': args.base_url or 'local',
+        'users': args.users,
+        'duration': args.duration,
+        'scenarios': scenarios,
+        **result,
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        Path(args.output).write_text(output + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,268 @@
+"""
+Throughput benchmark: the threaded search view under WSGI against the async
+search view (SEARCH_ASYNC) under ASGI.
+
+A local fake upstream stands in for both the search engine and the result pages,
+answering every request after a fixed delay, so the numbers reflect how many
+searches a single process keeps in flight while it waits on the network rather
+than anything about real sites. Every request searches a new query, so nothing is
+served from the result-set or title caches.
+
+Each application runs in its own child process (the URLconf picks the view at
+import time) with a throwaway SQLite database and a logged-in session:
+  * wsgi: rubik.wsgi.application called from a pool of --threads threads, i.e. a
+    gthread-style worker.
+  * asgi: rubik.asgi.application driven directly on one event loop with
+    --concurrency requests in flight, i.e. a single uvicorn-style worker.
+In both, googlesearch.search() is replaced by a call to the fake upstream (the
+async view runs it in a worker thread, as it does the real library).
+
+Usage (from the project root):
+    python benchmarks/search_throughput.py --requests 300 --threads 16 --concurrency 100 --latency 1.0
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import parse_qs, quote, urlsplit
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+RESULTS_PER_SEARCH = 20
+
+
+class FakeUpstream:
+    """
+    A fake search engine plus ``sites`` fake result sites (one port each, standing
+    in for separate hosts), all answering after ``latency`` seconds. Runs on its
+    own event loop thread, so it can hold thousands of keep-alive connections
+    without becoming the bottleneck.
+    """
+
+    def __init__(self, latency, sites):
+        self.latency = latency
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+        ports = [asyncio.run_coroutine_threadsafe(self._listen(), self.loop).result() for _ in range(sites + 1)]
+        self.base_url = f'http://127.0.0.1:{ports[0]}'
+        self.sites = [f'http://127.0.0.1:{port}' for port in ports[1:]]
+
+    async def _listen(self):
+        server = await asyncio.start_server(self._serve, '127.0.0.1', 0, backlog=4096)
+        return server.sockets[0].getsockname()[1]
+
+    def _body(self, target):
+        url = urlsplit(target)
+        if url.path == '/search':
+            query = parse_qs(url.query).get('q', [''])[0]
+            # One result URL per line; fake_search() below reads them back.
+            return '\n'.join(
+                f'{site}/page/{quote(query)}/{i}' for i, site in zip(range(RESULTS_PER_SEARCH), itertools.cycle(self.sites))
+            )
+        return f'<html><head><title>Page {url.path}</title></head><body>{"x" * 4000}</body></html>'
+
+    async def _serve(self, reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b'\r\n\r\n')
+                target = head.split(b' ', 2)[1].decode()
+                await asyncio.sleep(self.latency)
+                body = self._body(target).encode()
+                writer.write(
+                    b'HTTP/1.1 200 OK\r\nContent-Type: text/html; charset=utf-8\r\n'
+                    b'Content-Length: %d\r\n\r\n%s' % (len(body), body)
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+def setup_django(mode, upstream, database):
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'rubik.settings'
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    os.environ['SEARCH_ASYNC'] = 'True' if mode == 'asgi' else 'False'
+    os.environ['SEARCH_PREFETCH_NEXT_PAGE'] = 'False'
+    os.environ['SEARCH_TITLE_PER_HOST'] = '8'  # The fake sites all share the 127.0.0.1 hostname
+    os.environ['BULKHEAD_SEARCH'] = '0'  # Measure the views, not the bulkhead's shedding
+
+    from django.conf import settings
+    settings.DATABASES['default']['NAME'] = database
+    # Sessions in memory: the comparison is about waiting on the upstream, not SQLite writes.
+    # (in a cache of their own, so stored result sets can't crowd the session out).
+    settings.SESSION_ENGINE = 'django.contrib.sessions.backends.cache'
+    settings.CACHES['sessions'] = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'sessions'}
+    settings.SESSION_CACHE_ALIAS = 'sessions'
+
+    import django
+    django.setup()
+
+    import requests
+    from accounts import views
+
+    def fake_search(query, num_results=20, lang='en', **kwargs):
+        response = requests.get(f'{upstream}/search', params={'q': query}, timeout=30)
+        return response.text.splitlines()[:num_results]
+
+    views.search = fake_search
+
+    from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+    from django.contrib.auth.models import User
+    from django.contrib.sessions.backends.cache import SessionStore
+
+    user = User.objects.get(username='benchmark')
+    session = SessionStore()
+    session[SESSION_KEY] = str(user.pk)
+    session[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.save()
+    return f'{settings.SESSION_COOKIE_NAME}={session.session_key}'
+
+
+def search_query_string(query):
+    # A GET names its result set with rs; when that set isn't stored the view runs
+    # the query, which is what happens here on every request.
+    from accounts.search_results import result_set_key
+    return f'query={query}&rs={result_set_key(query)}'.encode()
+
+
+def run_wsgi(args, cookie):
+    import io
+    from rubik.wsgi import application
+
+    def one_request(i):
+        environ = {
+            'REQUEST_METHOD': 'GET', 'PATH_INFO': '/accounts/search/', 'QUERY_STRING': search_query_string(f'wsgi-{i}').decode(),
+            'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'HTTP_HOST': 'localhost', 'HTTP_COOKIE': cookie,
+            'wsgi.input': io.BytesIO(), 'wsgi.url_scheme': 'http', 'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+        }
+        status = []
+        started = time.perf_counter()
+        body = application(environ, lambda s, headers, exc_info=None: status.append(s))
+        b''.join(body)
+        body.close()
+        return status[0].startswith('200'), time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        started = time.perf_counter()
+        outcomes = list(pool.map(one_request, range(args.requests)))
+    return outcomes, time.perf_counter() - started
+
+
+def run_asgi(args, cookie):
+    from rubik.asgi import application
+
+    async def one_request(i, limit):
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+            'path': '/accounts/search/', 'raw_path': b'/accounts/search/', 'query_string': search_query_string(f'asgi-{i}'),
+            'root_path': '', 'headers': [(b'host', b'localhost'), (b'cookie', cookie.encode())],
+            'server': ('localhost', 80), 'client': ('127.0.0.1', 50000),
+        }
+        sent = []
+        request_sent = False
+
+        async def receive():
+            nonlocal request_sent
+            if not request_sent:
+                request_sent = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            await asyncio.Event().wait()  # The client never disconnects early
+
+        async def send(message):
+            sent.append(message)
+
+        async with limit:
+            started = time.perf_counter()
+            await application(scope, receive, send)
+            return sent[0]['status'] == 200, time.perf_counter() - started
+
+    async def main():
+        limit = asyncio.Semaphore(args.concurrency)
+        started = time.perf_counter()
+        outcomes = await asyncio.gather(*(one_request(i, limit) for i in range(args.requests)))
+        return outcomes, time.perf_counter() - started
+
+    return asyncio.run(main())
+
+
+def child(args):
+    cookie = setup_django(args.child, args.upstream, args.database)
+    runner = run_asgi if args.child == 'asgi' else run_wsgi
+    outcomes, elapsed = runner(args, cookie)
+    latencies = sorted(latency for ok, latency in outcomes)
+    print(json.dumps({
+        'mode': args.child,
+        'requests': len(outcomes),
+        'errors': sum(1 for ok, latency in outcomes if not ok),
+        'seconds': round(elapsed, 2),
+        'requests_per_second': round(len(outcomes) / elapsed, 1),
+        'median_ms': round(statistics.median(latencies) * 1000),
+        'p95_ms': round(latencies[int(len(latencies) * 0.95) - 1] * 1000),
+    }))
+
+
+def prepare_database(database):
+    env = dict(os.environ, SECRET_KEY=os.environ.get('SECRET_KEY', 'benchmark'))
+    script = (
+        "import sys; from django.conf import settings; settings.DATABASES['default']['NAME'] = sys.argv[1]; "
+        "import django; django.setup(); from django.core.management import call_command; "
+        "call_command('migrate', verbosity=0); from django.contrib.auth.models import User; "
+        "User.objects.create_user('benchmark', password='benchmark')"
+    )
+    env['DJANGO_SETTINGS_MODULE'] = 'rubik.settings'
+    subprocess.run([sys.executable, '-c', script, database], cwd=ROOT, env=env, check=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=300, help='Searches per run')
+    parser.add_argument('--threads', type=int, default=16, help='WSGI worker threads')
+    parser.add_argument('--concurrency', type=int, default=100, help='ASGI requests in flight')
+    parser.add_argument('--latency', type=float, default=1.0, help='Fake upstream delay per request, seconds')
+    parser.add_argument('--sites', type=int, default=20, help='Distinct fake sites the results point at')
+    parser.add_argument('--child', choices=['wsgi', 'asgi'], help=argparse.SUPPRESS)
+    parser.add_argument('--upstream', help=argparse.SUPPRESS)
+    parser.add_argument('--database', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args)
+        return
+
+    upstream = FakeUpstream(args.latency, args.sites)
+    with tempfile.TemporaryDirectory() as tmp:
+        database = os.path.join(tmp, 'bench.sqlite3')
+        prepare_database(database)
+        print(f'{args.requests} searches, upstream latency {args.latency}s, {args.sites} sites, '
+              f'WSGI threads {args.threads}, ASGI concurrency {args.concurrency}')
+        for mode in ('wsgi', 'asgi'):
+            output = subprocess.run(
+                [sys.executable, __file__, '--child', mode, '--upstream', upstream.base_url, '--database', database,
+                 '--requests', str(args.requests), '--threads', str(args.threads),
+                 '--concurrency', str(args.concurrency)],
+                cwd=ROOT, check=True, capture_output=True, text=True,
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{mode}: {result['requests_per_second']:>7} req/s  median {result['median_ms']} ms  "
+                  f"p95 {result['p95_ms']} ms  errors {result['errors']}")
+    upstream.stop()
+
+
+if __name__ == '__main__':
+    main()
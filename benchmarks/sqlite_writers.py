@@ -0,0 +1,115 @@
+"""
+Concurrent-writer stress test for SQLite: --processes worker processes hammer one
+database file with a registration burst and profile saves, first with the default
+SQLite settings and then with SQLITE_TUNED (WAL, busy_timeout, BEGIN IMMEDIATE).
+Reports committed writes per second and how many failed with "database is locked".
+
+Each writer loops for --seconds over:
+  * a registration: create_user(), whose signals create the profile;
+  * a profile save inside transaction.atomic(): read the profile, then save it,
+    the read-then-write pattern that can't wait out a lock held by another writer.
+
+Passwords are hashed with MD5 here so the numbers are about the database, not hashing.
+
+Usage (from the project root):
+    python benchmarks/sqlite_writers.py --processes 8 --seconds 10
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+MODES = {'default': 'False', 'tuned': 'True'}
+
+
+def environment(database, mode):
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE='rubik.settings', DATABASE_URL=f'sqlite:///{database}',
+               SQLITE_TUNED=MODES[mode], DB_CONN_MAX_AGE='60')
+    env.setdefault('SECRET_KEY', 'benchmark')
+    return env
+
+
+def prepare_database(database, mode):
+    script = "import django; django.setup(); from django.core.management import call_command; call_command('migrate', verbosity=0)"
+    subprocess.run([sys.executable, '-c', script], cwd=ROOT, env=environment(database, mode), check=True)
+
+
+def child(args):
+    import django
+    from django.conf import settings
+    settings.PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+    django.setup()
+
+    from django.contrib.auth.models import User
+    from django.db import OperationalError, transaction
+    from accounts.models import UserProfile
+
+    committed = locked = 0
+    profile_ids = []
+    deadline = time.monotonic() + args.seconds
+    i = 0
+    while time.monotonic() < deadline:
+        i += 1
+        try:
+            if i % 2 or not profile_ids:
+                user = User.objects.create_user(f'writer{args.writer}-{i}', f'writer{args.writer}-{i}@example.com', 'pw')
+                profile_ids.append(user.profile.pk)
+            else:
+                with transaction.atomic():
+                    profile = UserProfile.objects.get(pk=profile_ids[i % len(profile_ids)])
+                    profile.bio = f'Update {i}'
+                    profile.save()
+            committed += 1
+        except OperationalError as e:
+            if 'locked' not in str(e):
+                raise
+            locked += 1
+    print(json.dumps({'committed': committed, 'locked': locked}))
+
+
+def run(args, mode):
+    with tempfile.TemporaryDirectory() as tmp:
+        database = os.path.join(tmp, 'stress.sqlite3')
+        prepare_database(database, mode)
+        started = time.perf_counter()
+        writers = [
+            subprocess.Popen([sys.executable, __file__, '--child', '--writer', str(n), '--seconds', str(args.seconds)],
+                             cwd=ROOT, env=environment(database, mode), stdout=subprocess.PIPE, text=True)
+            for n in range(args.processes)
+        ]
+        results = [json.loads(writer.communicate()[0].strip().splitlines()[-1]) for writer in writers]
+        elapsed = time.perf_counter() - started
+    committed = sum(result['committed'] for result in results)
+    locked = sum(result['locked'] for result in results)
+    return {'mode': mode, 'committed': committed, 'locked_errors': locked,
+            'writes_per_second': round(committed / elapsed, 1),
+            'error_rate': round(locked / (committed + locked), 4) if committed + locked else 0.0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--processes', type=int, default=8, help='Concurrent writer processes')
+    parser.add_argument('--seconds', type=float, default=10.0, help='How long each writer runs')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--writer', type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args)
+        return
+    print(f'{args.processes} writer processes for {args.seconds}s each')
+    for mode in MODES:
+        result = run(args, mode)
+        print(f"{mode:>8}: {result['writes_per_second']:>7} writes/s  committed {result['committed']}  "
+              f"'database is locked' {result['locked_errors']} ({result['error_rate']:.1%})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Micro-benchmark: streaming <title> extraction (accounts.html_title) against the
+previous implementation, which downloaded the whole body and parsed it with
+BeautifulSoup.
+
+Both are fed the same saved HTML files through a streamed requests.Response, so
+only the reading and parsing work is compared (no network).
+
+Usage (from the project root):
+    python benchmarks/title_extraction.py path/to/corpus
+    python benchmarks/title_extraction.py --generate /tmp/title-corpus   # write a synthetic corpus and run on it
+
+The corpus is any directory of saved pages (*.html / *.htm), e.g. "Save page as"
+from a browser or `curl -o`.
+"""
+import argparse
+import io
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import requests
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from accounts.html_title import extract_title  # noqa: E402
+
+
+def make_response(body):
+    response = requests.models.Response()
+    response.status_code = 200
+    response.headers['Content-Type'] = 'text/html'
+    response.raw = io.BytesIO(body)
+    return response
+
+
+def old_title(response):
+    # The implementation get_title_from_url used before streaming extraction.
+    soup = BeautifulSoup(response.content, 'html.parser')
+    title_tag = soup.find('title')
+    return title_tag.string.strip() if title_tag and title_tag.string else "No title found"
+
+
+def new_title(response):
+    return extract_title(response) or "No title found"
+
+
+def measure(func, body, repeat):
+    timings = []
+    for _ in range(repeat):
+        response = make_response(body)
+        started = time.perf_counter()
+        title = func(response)
+        timings.append(time.perf_counter() - started)
+    response = make_response(body)
+    tracemalloc.start()
+    func(response)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return title, statistics.median(timings), peak, response.raw.tell()
+
+
+def generate_corpus(directory):
+    directory.mkdir(parents=True, exist_ok=True)
+    filler = '<div class="item"><p>Lorem ipsum dolor sit amet, consectetur adipiscing elit.</p></div>\n'
+    inline_script = '<script>window.__STATE__ = "' + 'x' * 40000 + '";</script>'
+    pages = {
+        'small.html': '<!doctype html><html><head><title>Small page</title></head><body>%s</body></html>' % (filler * 20),
+        'news_article.html': '<!doctype html><html><head><meta charset="utf-8"><title>Breaking: Something happened &amp; more</title>%s</head><body>%s</body></html>' % (inline_script, filler * 4000),
+        'big_head.html': '<!doctype html><html><head>%s<title>Title after a large inline script</title></head><body>%s</body></html>' % (inline_script * 3, filler * 8000),
+        'latin1.html': '<html><head><meta http-equiv="Content-Type" content="text/html; charset=iso-8859-1"><title>Café crème</title></head><body>%s</body></html>' % (filler * 500),
+        'no_title.html': '<html><head></head><body>%s</body></html>' % (filler * 2000),
+        'malformed.html': '<html><head><title>Unclosed <b>title</head><body>%s</body></html>' % (filler * 1000),
+    }
+    for name, content in pages.items():
+        encoding = 'iso-8859-1' if 'latin1' in name else 'utf-8'
+        (directory / name).write_bytes(content.encode(encoding))
+    return directory
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('corpus', nargs='?', type=Path, help='Directory of saved HTML files')
+    parser.add_argument('--generate', type=Path, metavar='DIR', help='Write a synthetic corpus to DIR and benchmark it')
+    parser.add_argument('--repeat', type=int, default=20, help='Runs per file and implementation (median is reported)')
+    args = parser.parse_args()
+
+    corpus = generate_corpus(args.generate) if args.generate else args.corpus
+    if corpus is None:
+        parser.error('give a corpus directory or --generate DIR')
+    files = sorted(p for p in corpus.iterdir() if p.suffix.lower() in ('.html', '.htm'))
+    if not files:
+        parser.error(f'no .html files in {corpus}')
+
+    header = f"{'file':<24} {'size':>9} {'old ms':>8} {'new ms':>8} {'speedup':>8} {'old peak':>9} {'new peak':>9} {'new read':>9}  titles match"
+    print(header)
+    print('-' * len(header))
+    totals = {'old': 0.0, 'new': 0.0}
+    for path in files:
+        body = path.read_bytes()
+        old, old_time, old_peak, _ = measure(old_title, body, args.repeat)
+        new, new_time, new_peak, new_read = measure(new_title, body, args.repeat)
+        totals['old'] += old_time
+        totals['new'] += new_time
+        print(f"{path.name[:24]:<24} {len(body) // 1024:>7}KB {old_time * 1000:>8.2f} {new_time * 1000:>8.2f} "
+              f"{old_time / new_time:>7.1f}x {old_peak // 1024:>7}KB {new_peak // 1024:>7}KB {new_read // 1024:>7}KB  "
+              f"{'yes' if old == new else f'no ({old!r} vs {new!r})'}")
+    print('-' * len(header))
+    print(f"total median time: old {totals['old'] * 1000:.2f} ms, new {totals['new'] * 1000:.2f} ms "
+          f"({totals['old'] / totals['new']:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,25 @@
+"""
+gunicorn settings; `gunicorn rubik.wsgi` reads this file from the project root.
+
+Each worker is a gthread worker with one thread per bulkhead slot: BULKHEAD_SEARCH
+for searches (which mostly wait on upstream sites) plus BULKHEAD_DEFAULT for
+everything else, read from the same environment as rubik/settings.py. The bulkhead
+middleware turns away searches beyond their share with a 503, so the other threads
+always remain for logins, pages and the admin dashboard.
+"""
+import multiprocessing
+
+import decouple # Not `from decouple import config`: gunicorn would take `config` for its own setting
+
+bind = decouple.config('GUNICORN_BIND', default='0.0.0.0:8000')
+workers = decouple.config('GUNICORN_WORKERS', default=multiprocessing.cpu_count() + 1, cast=int)
+worker_class = 'gthread'
+threads = max(1, decouple.config('BULKHEAD_SEARCH', default=8, cast=int) + decouple.config('BULKHEAD_DEFAULT', default=8, cast=int))
+# Longer than the slowest search (SEARCH_COALESCE_WAIT plus SEARCH_TITLE_DEADLINE) takes.
+timeout = decouple.config('GUNICORN_TIMEOUT', default=60, cast=int)
+graceful_timeout = 30
+keepalive = 5
+# Recycle workers now and then so a slow leak can't build up; jittered so they don't all restart at once.
+max_requests = decouple.config('GUNICORN_MAX_REQUESTS', default=2000, cast=int)
+max_requests_jitter = 200
+accesslog = '-'
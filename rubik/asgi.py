@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'rubik.settings')
+# Under ASGI, search runs on the event loop (accounts.async_search) by default.
+os.environ.setdefault('SEARCH_ASYNC', 'True')
 
 application = get_asgi_application()
@@ -0,0 +1,100 @@
+"""
+Bulkheads: separate concurrency limits per route class, per worker process.
+
+A search can hold its thread for tens of seconds waiting on upstream sites. Without
+a limit a few concurrent searches occupy every thread of a worker, and logins, the
+home page and the admin dashboard queue behind them. BulkheadMiddleware (first in
+MIDDLEWARE) sorts each request into a route class by URL name (BULKHEAD_ROUTES;
+anything unlisted is 'default') and lets at most BULKHEAD_LIMITS[class] of them run
+at once. One over the limit is answered at once with 503 and a Retry-After header,
+before the session or user is even loaded, rather than waiting for a thread.
+
+gunicorn.conf.py gives each worker as many threads as the limits add up to, so the
+search class can fill its own share and never the rest.
+"""
+import threading
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+from django.urls import Resolver404, resolve
+
+BUSY_MESSAGE = 'The server is busy right now. Please try again in a few seconds.'
+
+
+class BulkheadMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        self.route_classes = {name: route_class for route_class, names in settings.BULKHEAD_ROUTES.items()
+                              for name in names}
+        self.slots = {route_class: threading.BoundedSemaphore(limit)
+                      for route_class, limit in settings.BULKHEAD_LIMITS.items() if limit}
+
+    def route_class(self, request):
+        try:
+            url_name = resolve(request.path_info).url_name
+        except Resolver404:
+            return 'default'
+        return self.route_classes.get(url_name, 'default')
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        slots = self.slots.get(self.route_class(request))
+        if slots is None:
+            return self.get_response(request)
+        if not slots.acquire(blocking=False):
+            return self.busy(request)
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            slots.release()
+            raise
+        return self._release_when_sent(response, slots)
+
+    async def __acall__(self, request):
+        slots = self.slots.get(self.route_class(request))
+        if slots is None:
+            return await self.get_response(request)
+        if not slots.acquire(blocking=False):
+            return self.busy(request)
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            slots.release()
+            raise
+        return self._release_when_sent(response, slots)
+
+    @staticmethod
+    def _release_when_sent(response, slots):
+        if not response.streaming:
+            slots.release()
+            return response
+        # A streamed response (the search event stream) keeps working until the server
+        # has sent it all, and the server closes every response when it is done with it.
+        close = response.close
+        released = threading.Event()
+
+        def close_and_release():
+            try:
+                close()
+            finally:
+                if not released.is_set():
+                    released.set()
+                    slots.release()
+        response.close = close_and_release
+        return response
+
+    @staticmethod
+    def busy(request):
+        if 'application/json' in request.headers.get('Accept', ''):
+            response = JsonResponse({'error': BUSY_MESSAGE}, status=503)
+        else:
+            response = HttpResponse(BUSY_MESSAGE, status=503, content_type='text/plain; charset=utf-8')
+        response['Retry-After'] = str(settings.BULKHEAD_RETRY_AFTER)
+        return response
@@ -0,0 +1,128 @@
+"""
+Read replicas (DATABASE_REPLICA_URLS): reads go to a replica, writes to the primary.
+
+Replicas lag behind the primary, so whoever just wrote something reads from the
+primary for the next DB_REPLICA_PIN_SECONDS: the rest of the request (or, outside
+requests, of the current thread / task) after its first write, and, through a
+cookie set by PinPrimaryMiddleware, the browser's following requests. Only SQL that
+changes data on the primary pins; a query merely routed as a write, such as the
+lookup half of get_or_create(), doesn't. An admin
+approving a user is redirected to a dashboard that already shows the approval;
+someone saving their profile sees the new profile on the next page.
+"""
+import math
+import random
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.backends.signals import connection_created
+
+PIN_COOKIE = 'db_primary'
+
+_pinned_until = ContextVar('pinned_until', default=0.0)
+
+
+def pin_primary(seconds=None):
+    """Read from the primary for the next ``seconds`` (DB_REPLICA_PIN_SECONDS) in this context."""
+    seconds = settings.DB_REPLICA_PIN_SECONDS if seconds is None else seconds
+    _pinned_until.set(max(_pinned_until.get(), time.monotonic() + seconds))
+
+
+def is_pinned():
+    return _pinned_until.get() > time.monotonic()
+
+
+@contextmanager
+def without_pinning():
+    """
+    Writes inside the block don't pin: for bookkeeping rows that are always read from
+    the primary and never shown back to whoever caused the write.
+    """
+    token = _pinned_until.set(_pinned_until.get())
+    try:
+        yield
+    finally:
+        _pinned_until.reset(token)
+
+
+WRITE_SQL = re.compile(r'\s*(INSERT|UPDATE|DELETE|REPLACE)\b', re.IGNORECASE)
+
+
+def pin_on_write(execute, sql, params, many, context):
+    """Execute wrapper on the primary's connections: pin once a statement changes data."""
+    if WRITE_SQL.match(sql):
+        pin_primary()
+    return execute(sql, params, many, context)
+
+
+def watch_writes(sender, connection, **kwargs):
+    if connection.alias == DEFAULT_DB_ALIAS and pin_on_write not in connection.execute_wrappers:
+        connection.execute_wrappers.append(pin_on_write)
+
+
+connection_created.connect(watch_writes, dispatch_uid='rubik.db_router.watch_writes')
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if is_pinned() or not settings.DATABASE_REPLICAS:
+            return 'default'
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
+
+
+class PinPrimaryMiddleware:
+    """
+    Goes first in MIDDLEWARE, so that the session and user are loaded from the
+    primary too when the browser's last write was less than DB_REPLICA_PIN_SECONDS ago.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token, pinned_until = self._start(request)
+        try:
+            return self._finish(self.get_response(request), pinned_until)
+        finally:
+            _pinned_until.reset(token)
+
+    async def __acall__(self, request):
+        token, pinned_until = self._start(request)
+        try:
+            return self._finish(await self.get_response(request), pinned_until)
+        finally:
+            _pinned_until.reset(token)
+
+    @staticmethod
+    def _start(request):
+        pinned_until = time.monotonic() + settings.DB_REPLICA_PIN_SECONDS if PIN_COOKIE in request.COOKIES else 0.0
+        return _pinned_until.set(pinned_until), pinned_until
+
+    @staticmethod
+    def _finish(response, pinned_until):
+        # Only a write extends the pin; reads while pinned don't renew the cookie.
+        if _pinned_until.get() > pinned_until:
+            response.set_cookie(PIN_COOKIE, '1', max_age=math.ceil(settings.DB_REPLICA_PIN_SECONDS), httponly=True,
+                                samesite='Lax', secure=settings.SESSION_COOKIE_SECURE)
+        return response
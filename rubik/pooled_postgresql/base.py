@@ -0,0 +1,122 @@
+"""
+PostgreSQL backend with a per-process connection pool (ENGINE 'rubik.pooled_postgresql',
+set up from DB_POOL_SIZE in settings).
+
+Django opens a connection on a thread's first query and closes it at the end of the
+request (CONN_MAX_AGE=0). With this backend "open" takes an idle connection from the
+pool and "close" rolls back anything left open and puts it back, so requests on any
+thread reuse a few warm connections instead of each thread keeping its own. At most
+``max_size`` connections exist per process; a thread that finds them all in use waits
+up to ``timeout`` seconds, then gets an OperationalError.
+
+OPTIONS['POOL'] = {'max_size': 10, 'timeout': 5.0, 'max_lifetime': 1800}
+"""
+import os
+import threading
+import time
+
+from django.db.backends.postgresql.base import DatabaseWrapper as PostgreSQLDatabaseWrapper
+from django.db.backends.postgresql.psycopg_any import IsolationLevel
+from psycopg2 import OperationalError
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_UNKNOWN
+
+DEFAULT_POOL = {'max_size': 10, 'timeout': 5.0, 'max_lifetime': 30 * 60}
+
+
+class PoolTimeout(OperationalError):
+    pass
+
+
+class ConnectionPool:
+    def __init__(self, max_size, timeout, max_lifetime):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._idle = [] # (connection, opened_at); the most recently used is reused first
+        self._opened_at = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, connect):
+        """Return an idle connection, or one made by ``connect()`` if none is idle."""
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolTimeout(f'No database connection became free within {self.timeout}s '
+                              f'(all {self.max_size} in use). Raise DB_POOL_SIZE or DB_POOL_TIMEOUT.')
+        try:
+            while True:
+                with self._lock:
+                    connection, opened_at = self._idle.pop() if self._idle else (None, None)
+                if connection is None:
+                    connection = connect()
+                    with self._lock:
+                        self._opened_at[id(connection)] = time.monotonic()
+                    return connection
+                if not connection.closed and time.monotonic() - opened_at < self.max_lifetime:
+                    with self._lock:
+                        self._opened_at[id(connection)] = opened_at
+                    return connection
+                self._discard(connection)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, connection):
+        """Give ``connection`` back, or close it if it is broken."""
+        try:
+            with self._lock:
+                opened_at = self._opened_at.pop(id(connection), None)
+            status = TRANSACTION_STATUS_UNKNOWN if connection.closed else connection.get_transaction_status()
+            if status == TRANSACTION_STATUS_UNKNOWN or opened_at is None:
+                self._discard(connection)
+                return
+            if status != TRANSACTION_STATUS_IDLE:
+                try:
+                    connection.rollback()
+                except Exception:
+                    self._discard(connection)
+                    return
+            with self._lock:
+                self._idle.append((connection, opened_at))
+        finally:
+            self._slots.release()
+
+    @staticmethod
+    def _discard(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(settings_dict):
+    # One pool per database per process; a forked child must not share its parent's sockets.
+    key = (os.getpid(), settings_dict['NAME'], settings_dict['USER'], settings_dict['HOST'], settings_dict['PORT'])
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            options = {**DEFAULT_POOL, **settings_dict['OPTIONS'].get('POOL', {})}
+            pool = _pools[key] = ConnectionPool(options['max_size'], options['timeout'], options['max_lifetime'])
+        return pool
+
+
+class DatabaseWrapper(PostgreSQLDatabaseWrapper):
+    def get_connection_params(self):
+        conn_params = super().get_connection_params()
+        conn_params.pop('POOL', None)
+        return conn_params
+
+    def get_new_connection(self, conn_params):
+        connection = get_pool(self.settings_dict).acquire(lambda: super(DatabaseWrapper, self).get_new_connection(conn_params))
+        # What the parent sets when it opens a connection.
+        isolation_level = self.settings_dict['OPTIONS'].get('isolation_level')
+        self.isolation_level = IsolationLevel.READ_COMMITTED if isolation_level is None else IsolationLevel(isolation_level)
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                get_pool(self.settings_dict).release(self.connection)
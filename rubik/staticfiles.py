@@ -0,0 +1,215 @@
+"""
+Static files: content-hashed names, precompressed copies, and serving them from
+the WSGI process.
+
+CompressedManifestStaticFilesStorage (STORAGES['staticfiles']) makes
+collectstatic write ``css/custom.<hash>.css`` next to ``css/custom.css``, as
+Django's ManifestStaticFilesStorage does, plus ``.gz`` and ``.br`` siblings of
+every text asset that compresses well. {% static %} links to the hashed names,
+which never change content and so can be cached for a year.
+
+StaticFilesApplication wraps the Django WSGI application (rubik/wsgi.py, when
+STATIC_SERVE is on). It indexes STATIC_ROOT once at startup and answers requests
+under STATIC_URL itself: it picks the brotli, gzip or plain file according to
+Accept-Encoding and hands the open file to the server's ``wsgi.file_wrapper``,
+which gunicorn sends with sendfile(). Anything it doesn't know goes to Django.
+"""
+import gzip
+import json
+import mimetypes
+import os
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.utils.http import http_date, parse_http_date_safe
+
+try:
+    import brotli
+except ImportError: # Optional: without it only gzip copies are made
+    brotli = None
+
+COMPRESSIBLE = {'.css', '.js', '.mjs', '.map', '.svg', '.json', '.txt', '.html', '.xml', '.ico', '.ttf', '.otf', '.eot'}
+MIN_SAVING = 0.05 # Keep a compressed copy only if it is at least 5% smaller
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+BLOCK_SIZE = 64 * 1024
+
+# (Content-Encoding, file suffix), in order of preference.
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def compress(data):
+    """Return ``{Content-Encoding: bytes}`` for the encodings that make ``data`` usefully smaller."""
+    candidates = {'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        candidates['br'] = brotli.compress(data, quality=11)
+    return {coding: body for coding, body in candidates.items() if len(body) <= len(data) * (1 - MIN_SAVING)}
+
+
+def _without_source_maps(patterns):
+    return tuple(
+        (extension, tuple(pattern for pattern in rules if 'sourceMappingURL' not in str(pattern)))
+        for extension, rules in patterns
+    )
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    # No source maps are shipped, so the vendored files' sourceMappingURL comments
+    # are left alone instead of failing collectstatic on the missing .map files.
+    patterns = _without_source_maps(ManifestStaticFilesStorage.patterns)
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        names = set(paths) | set(self.hashed_files.values())
+        for name in sorted(names):
+            if os.path.splitext(name)[1].lower() not in COMPRESSIBLE or not self.exists(name):
+                continue
+            with self.open(name) as original:
+                data = original.read()
+            compressed = compress(data)
+            for coding, suffix in ENCODINGS:
+                path = self.path(name + suffix)
+                if coding in compressed:
+                    with open(path, 'wb') as f:
+                        f.write(compressed[coding])
+                elif os.path.exists(path):
+                    os.remove(path) # Left over from an earlier version of the file
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            # Not collected (development, tests, or a file missing from static/): link the plain name.
+            return name
+
+
+class StaticFile:
+    def __init__(self, path, immutable):
+        stat = path.stat()
+        self.path = path
+        self.size = stat.st_size
+        self.mtime = int(stat.st_mtime)
+        content_type, _ = mimetypes.guess_type(path.name)
+        content_type = content_type or 'application/octet-stream'
+        if content_type.startswith('text/') or content_type in ('application/javascript', 'application/json'):
+            content_type += '; charset=utf-8'
+        self.content_type = content_type
+        self.immutable = immutable
+        # Content-Encoding -> (path, size) of the precompressed copies present
+        self.encodings = {}
+        for coding, suffix in ENCODINGS:
+            compressed = path.with_name(path.name + suffix)
+            if compressed.is_file():
+                self.encodings[coding] = (compressed, compressed.stat().st_size)
+
+    def variant(self, coding):
+        """Return ``(path, size, etag)`` of the file sent for Content-Encoding ``coding`` (None for none)."""
+        path, size = self.encodings[coding] if coding else (self.path, self.size)
+        return path, size, f'"{self.mtime:x}-{self.size:x}{"-" + coding if coding else ""}"'
+
+
+def _accepted_encodings(header):
+    accepted = {}
+    for part in header.split(','):
+        coding, _, params = part.partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding.strip():
+            accepted[coding.strip().lower()] = quality
+    return accepted
+
+
+class StaticFilesApplication:
+    """WSGI middleware serving the files collected in ``root`` under the ``prefix`` URL path."""
+
+    def __init__(self, application, root=None, prefix=None, max_age=None):
+        self.application = application
+        self.root = Path(root or settings.STATIC_ROOT)
+        self.prefix = prefix or urlsplit(settings.STATIC_URL).path
+        self.max_age = settings.STATIC_MAX_AGE if max_age is None else max_age
+        self.files = self._index()
+
+    def _index(self):
+        if not self.root.is_dir():
+            return {}
+        manifest = self.root / ManifestStaticFilesStorage.manifest_name
+        hashed = set()
+        if manifest.is_file():
+            hashed = set(json.loads(manifest.read_text()).get('paths', {}).values())
+        files = {}
+        for directory, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                path = Path(directory) / filename
+                name = path.relative_to(self.root).as_posix()
+                if filename.endswith(tuple(suffix for _, suffix in ENCODINGS)) or path == manifest:
+                    continue
+                files[name] = StaticFile(path, immutable=name in hashed)
+        return files
+
+    def __call__(self, environ, start_response):
+        if environ.get('REQUEST_METHOD') in ('GET', 'HEAD'):
+            path = environ.get('SCRIPT_NAME', '') + environ.get('PATH_INFO', '')
+            if path.startswith(self.prefix):
+                static_file = self.files.get(path[len(self.prefix):])
+                if static_file is not None:
+                    return self.serve(static_file, environ, start_response)
+        return self.application(environ, start_response)
+
+    def serve(self, static_file, environ, start_response):
+        accepted = _accepted_encodings(environ.get('HTTP_ACCEPT_ENCODING', ''))
+        coding = next((coding for coding, _ in ENCODINGS if coding in static_file.encodings
+                       and accepted.get(coding, accepted.get('*', 0)) > 0), None)
+        path, size, etag = static_file.variant(coding)
+
+        if static_file.immutable:
+            cache_control = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+        else:
+            cache_control = f'public, max-age={self.max_age}'
+        headers = [
+            ('Cache-Control', cache_control),
+            ('ETag', etag),
+            ('Last-Modified', http_date(static_file.mtime)),
+        ]
+        if static_file.encodings:
+            headers.append(('Vary', 'Accept-Encoding'))
+
+        if self._not_modified(environ, etag, static_file.mtime):
+            start_response('304 Not Modified', headers)
+            return []
+
+        headers.append(('Content-Type', static_file.content_type))
+        headers.append(('Content-Length', str(size)))
+        if coding:
+            headers.append(('Content-Encoding', coding))
+        start_response('200 OK', headers)
+        if environ['REQUEST_METHOD'] == 'HEAD':
+            return []
+        f = open(path, 'rb')
+        file_wrapper = environ.get('wsgi.file_wrapper')
+        if file_wrapper is not None:
+            return file_wrapper(f, BLOCK_SIZE)
+        return _read_blocks(f)
+
+    @staticmethod
+    def _not_modified(environ, etag, mtime):
+        if_none_match = environ.get('HTTP_IF_NONE_MATCH')
+        if if_none_match is not None:
+            tags = [tag.strip() for tag in if_none_match.split(',')]
+            return '*' in tags or etag in tags or f'W/{etag}' in tags
+        since = parse_http_date_safe(environ.get('HTTP_IF_MODIFIED_SINCE') or '')
+        return since is not None and mtime <= since
+
+
+def _read_blocks(f):
+    with f:
+        while block := f.read(BLOCK_SIZE):
+            yield block
@@ -0,0 +1,44 @@
+"""
+SQLite backend for running several worker processes against one database file
+(ENGINE 'rubik.tuned_sqlite', set up by SQLITE_TUNED in settings).
+
+Every new connection gets OPTIONS['PRAGMAS']: WAL journaling, so readers never
+block the writer or each other; synchronous=NORMAL, which is durable in WAL mode
+except for the last commits on power loss; a busy_timeout, so a writer waits for
+the lock instead of failing at once; plus mmap and page cache sizes.
+
+Transactions (transaction.atomic) start with BEGIN IMMEDIATE, taking the write
+lock up front. With the default deferred BEGIN, a transaction that reads and then
+writes has to upgrade its lock; if another connection wrote in between, SQLite
+can't wait it out and fails at once with "database is locked", busy_timeout or not.
+"""
+from django.db.backends.sqlite3.base import DatabaseWrapper as SQLiteDatabaseWrapper
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000, # Milliseconds
+    'mmap_size': 128 * 1024 * 1024,
+    'cache_size': -64000, # Negative: KiB rather than pages
+}
+
+
+class DatabaseWrapper(SQLiteDatabaseWrapper):
+    def get_connection_params(self):
+        conn_params = super().get_connection_params()
+        conn_params.pop('PRAGMAS', None)
+        # Python's own wait for the lock, in seconds; kept in step with busy_timeout.
+        conn_params.setdefault('timeout', self._pragmas()['busy_timeout'] / 1000)
+        return conn_params
+
+    def _pragmas(self):
+        return {**DEFAULT_PRAGMAS, **self.settings_dict['OPTIONS'].get('PRAGMAS', {})}
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self._pragmas().items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute('BEGIN IMMEDIATE')
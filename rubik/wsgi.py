@@ -14,3 +14,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'rubik.settings')
 
 application = get_wsgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.STATIC_SERVE:
+    # Serve collected (hashed, precompressed) static files without reaching Django.
+    from .staticfiles import StaticFilesApplication
+    application = StaticFilesApplication(application)